@@ -1,8 +1,14 @@
 from flask import Flask, render_template, request, jsonify
 import os
-from google.api_core.client_options import ClientOptions
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import discoveryengine_v1 as discoveryengine
 from config import config
+from search_cache import create_search_cache, make_cache_key
+from search_results import extract_results
+from search_params import SearchParams, build_filter_expression, parse_search_params
+from vector_search import create_vector_search
+from search_client import SearchClientPool, build_search_templates, build_warmup_operation_name
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -11,158 +17,99 @@ def create_app(config_name=None):
     # Load configuration
     config_name = config_name or os.environ.get('FLASK_ENV', 'default')
     app.config.from_object(config[config_name])
+    if app.config.get('SEARCH_DEBUG_LOGGING'):
+        app.logger.setLevel('DEBUG')
+    
+    # Shared cache for search responses
+    app.extensions['search_cache'] = create_search_cache(app.config)
+    
+    # Long-lived search clients and the request parts shared by every query
+    app.extensions['search_clients'] = SearchClientPool(
+        app.config['VERTEX_AI_LOCATION'],
+        app.config.get('SEARCH_CLIENT_POOL_SIZE', 2),
+    )
+    app.extensions['search_templates'] = build_search_templates(app.config)
+    
+    # Local vector index used for /api/vector_search and as a fallback
+    try:
+        app.extensions['vector_search'] = create_vector_search(app.config)
+    except Exception as e:
+        app.logger.error(f"Failed to load vector index: {e}")
+        app.extensions['vector_search'] = None
+    
+    # Generates deferred summaries in the background while results are served
+    app.extensions['summary_executor'] = ThreadPoolExecutor(
+        max_workers=app.config.get('SUMMARY_WORKERS', 4),
+        thread_name_prefix='summary',
+    )
+    # Bounds the prefetch backlog so a burst of searches cannot queue
+    # summaries without limit
+    app.extensions['summary_slots'] = threading.BoundedSemaphore(app.config.get('SUMMARY_MAX_PENDING', 16))
     
     return app
 
 app = create_app()
 
-def search_sample(search_query: str):
-    """Search for media using Vertex AI Discovery Engine"""
-    try:
-        # Get configuration
-        project_id = app.config['GOOGLE_CLOUD_PROJECT']
-        location = app.config['VERTEX_AI_LOCATION']
-        engine_id = app.config['VERTEX_AI_ENGINE_ID']
-        
-        client_options = (
-            ClientOptions(api_endpoint=f"{location}-discoveryengine.googleapis.com")
-            if location != "global"
-            else None
-        )
-
-        # Create a client
-        client = discoveryengine.SearchServiceClient(client_options=client_options)
-
-        # The full resource name of the search app serving config
-        serving_config = f"projects/{project_id}/locations/{location}/collections/default_collection/engines/{engine_id}/servingConfigs/default_config"
-
-        # Configuration options for search
-        content_search_spec = discoveryengine.SearchRequest.ContentSearchSpec(
-            snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
-                return_snippet=True
-            ),
-            summary_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec(
-                summary_result_count=5,
-                include_citations=True,
-                ignore_adversarial_query=True,
-                ignore_non_summary_seeking_query=True,
-                model_prompt_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec.ModelPromptSpec(
-                    preamble="Provide a brief summary of the video content."
-                ),
-                model_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec.ModelSpec(
-                    version="stable",
-                ),
-            ),
-        )
+def parse_request_params(get_all) -> SearchParams:
+    """Search parameters from a query string, bounded by the configured page sizes"""
+    return parse_search_params(
+        get_all,
+        app.config.get('DEFAULT_PAGE_SIZE', 10),
+        app.config.get('MAX_PAGE_SIZE', 20),
+    )
 
-        # Create search request
-        request = discoveryengine.SearchRequest(
-            serving_config=serving_config,
-            query=search_query,
-            page_size=app.config.get('DEFAULT_PAGE_SIZE', 10),
-            content_search_spec=content_search_spec,
-            query_expansion_spec=discoveryengine.SearchRequest.QueryExpansionSpec(
-                condition=discoveryengine.SearchRequest.QueryExpansionSpec.Condition.AUTO,
-            ),
-            spell_correction_spec=discoveryengine.SearchRequest.SpellCorrectionSpec(
-                mode=discoveryengine.SearchRequest.SpellCorrectionSpec.Mode.AUTO
-            ),
-        )
+def build_search_request(params: SearchParams, include_summary: bool = True) -> discoveryengine.SearchRequest:
+    """Search request for a query, built from the precomputed templates"""
+    template = 'inline' if include_summary else 'results'
+    fields = {'query': params.query, 'page_size': params.page_size}
+    if params.filters:
+        fields['filter'] = build_filter_expression(params.filters)
+    # A page token continues the previous page without re-ranking from the start
+    if params.page_token:
+        fields['page_token'] = params.page_token
+    elif params.offset:
+        fields['offset'] = params.offset
+    return discoveryengine.SearchRequest(app.extensions['search_templates'][template], **fields)
 
-        page_result = client.search(request)
-        
-        # Process results
-        results = []
-        summary = None
-        
-        app.logger.info(f"Search query: {search_query}")
-        app.logger.info(f"Total results available: {page_result.total_size}")
-        app.logger.info(f"Results in this page: {len(page_result.results)}")
-        
-        # Extract summary if available
-        if hasattr(page_result, 'summary') and page_result.summary:
-            summary = page_result.summary.summary_text
-            app.logger.info(f"Found summary: {summary}")
-        
-        # Process only the results in this page (correctly limited by page_size)
-        for result in page_result.results:
-            app.logger.info(f"Processing result: {type(result)}")
-            
-            # Each result has a document
-            if hasattr(result, 'document'):
-                document = result.document
-                result_data = {
-                    'id': document.id if hasattr(document, 'id') else 'unknown',
-                    'title': 'Untitled Video',
-                    'snippet': '',
-                    'uri': '',
-                    'thumbnail': ''
-                }
-                
-                # Extract data from struct_data
-                if hasattr(document, 'struct_data') and document.struct_data:
-                    struct_data = dict(document.struct_data)
-                    app.logger.info(f"Struct data keys: {list(struct_data.keys())}")
-                    
-                    # Extract title from various possible fields
-                    result_data['title'] = (
-                        struct_data.get('video_title', '') or 
-                        struct_data.get('title', '') or 
-                        struct_data.get('name', '') or 
-                        'Untitled Video'
-                    )
-                    
-                    # Extract video source/URI
-                    result_data['uri'] = (
-                        struct_data.get('video_src', '') or 
-                        struct_data.get('uri', '') or 
-                        struct_data.get('url', '') or
-                        struct_data.get('link', '')
-                    )
-                    
-                    # Extract description/snippet
-                    result_data['snippet'] = (
-                        struct_data.get('video_desc', '') or
-                        struct_data.get('document_description', '') or
-                        struct_data.get('description', '') or
-                        struct_data.get('snippet', '') or
-                        struct_data.get('document_transcript', '') or
-                        ''
-                    )
-                    
-                    # For thumbnails, check if we have direct thumbnail data
-                    # Skip generating protected URLs for now - use placeholders
-                    result_data['thumbnail'] = ''  # Let the frontend handle placeholders
-                
-                # Also check derived_struct_data for additional info
-                if hasattr(document, 'derived_struct_data') and document.derived_struct_data:
-                    derived_data = dict(document.derived_struct_data)
-                    app.logger.info(f"Derived data keys: {list(derived_data.keys())}")
-                    
-                    # Extract snippets if available
-                    if 'snippets' in derived_data and not result_data['snippet']:
-                        snippets_list = derived_data['snippets']
-                        if hasattr(snippets_list, 'list_value') and snippets_list.list_value.values:
-                            for snippet_item in snippets_list.list_value.values:
-                                if hasattr(snippet_item, 'struct_value'):
-                                    snippet_struct = dict(snippet_item.struct_value.fields)
-                                    if 'snippet' in snippet_struct:
-                                        snippet_text = snippet_struct['snippet'].string_value
-                                        if snippet_text != "No snippet is available for this page.":
-                                            result_data['snippet'] = snippet_text
-                                            break
-                
-                app.logger.info(f"Final result data: {result_data}")
-                results.append(result_data)
-        
-        app.logger.info(f"Total results processed: {len(results)}")
-        
-        return {
-            'results': results,
-            'summary': summary,
-            'total_results': page_result.total_size,  # Use total available, not just current page
-            'page_results': len(results)  # Results in current page
+def format_search_response(params: SearchParams, page_result) -> dict:
+    """Convert a search response page into the JSON shape used by the UI"""
+    summary = None
+    if page_result.summary:
+        summary = page_result.summary.summary_text or None
+    
+    results = extract_results(page_result.results)
+    facets = [
+        {
+            'key': facet.key,
+            'values': [{'value': value.value, 'count': value.count} for value in facet.values],
         }
+        for facet in page_result.facets
+    ]
+    
+    if app.config.get('SEARCH_DEBUG_LOGGING'):
+        app.logger.debug(f"Search params: {params}")
+        app.logger.debug(f"Total results available: {page_result.total_size}")
+        app.logger.debug(f"Summary: {summary}")
+        for result_data in results:
+            app.logger.debug(f"Result data: {result_data}")
+    
+    return {
+        'results': results,
+        'summary': summary,
+        'facets': facets,
+        'total_results': page_result.total_size,  # Use total available, not just current page
+        'page_results': len(results),  # Results in current page
+        'page_size': params.page_size,
+        'offset': params.offset,
+        'next_page_token': page_result.next_page_token or None,
+    }
+
+def search_sample(params: SearchParams, include_summary: bool = True):
+    """Search for media using Vertex AI Discovery Engine"""
+    try:
+        client = app.extensions['search_clients'].get()
+        page_result = client.search(build_search_request(params, include_summary))
+        return format_search_response(params, page_result)
         
     except Exception as e:
         app.logger.error(f"Search error: {str(e)}")
@@ -171,10 +118,134 @@ def search_sample(search_query: str):
         return {
             'results': [],
             'summary': None,
+            'facets': [],
             'total_results': 0,
             'error': str(e)
         }
 
+def summary_sample(search_query: str):
+    """Generate the search summary for a query on its own"""
+    try:
+        client = app.extensions['search_clients'].get()
+        request = discoveryengine.SearchRequest(
+            app.extensions['search_templates']['summary'],
+            query=search_query,
+        )
+        page_result = client.search(request)
+        summary = page_result.summary.summary_text if page_result.summary else None
+        return {'summary': summary or None}
+    except Exception as e:
+        app.logger.error(f"Summary error: {str(e)}")
+        return {'summary': None, 'error': str(e)}
+
+def search_cache_key(params: SearchParams, include_summary: bool) -> str:
+    return make_cache_key(
+        params.query,
+        params.page_size,
+        params.filters,
+        kind='search' if include_summary else 'results',
+        page=params.page_token or params.offset,
+    )
+
+def _page_token_key(params: SearchParams, offset: int) -> str:
+    # Discovery Engine only accepts a page token with the exact query it was
+    # issued for, so tokens are not shared between spellings of a query
+    return make_cache_key(params.query, params.page_size, params.filters, kind='page_token', page=offset, normalize=False)
+
+def resolve_page_token(params: SearchParams) -> SearchParams:
+    """
+    Continue from the page token cached for this offset, if an earlier
+    request paged forward to it, instead of searching from the start.
+    """
+    if params.page_token or not params.offset:
+        return params
+    page_token = app.extensions['search_cache'].recall(_page_token_key(params, params.offset))
+    return params._replace(page_token=page_token) if page_token else params
+
+def remember_next_page(params: SearchParams, search_results: dict):
+    """Cache the token for the page after this one, keyed by its offset"""
+    next_page_token = search_results.get('next_page_token')
+    if next_page_token and not params.page_token:
+        app.extensions['search_cache'].remember(
+            _page_token_key(params, params.offset + params.page_size),
+            next_page_token,
+        )
+
+async def resolve_page_token_async(params: SearchParams) -> SearchParams:
+    """Async counterpart of `resolve_page_token` that does not block the event loop"""
+    if params.page_token or not params.offset:
+        return params
+    page_token = await app.extensions['search_cache'].recall_async(_page_token_key(params, params.offset))
+    return params._replace(page_token=page_token) if page_token else params
+
+async def remember_next_page_async(params: SearchParams, search_results: dict):
+    """Async counterpart of `remember_next_page` that does not block the event loop"""
+    next_page_token = search_results.get('next_page_token')
+    if next_page_token and not params.page_token:
+        await app.extensions['search_cache'].remember_async(
+            _page_token_key(params, params.offset + params.page_size),
+            next_page_token,
+        )
+
+def vector_fallback(params: SearchParams, search_results: dict) -> dict:
+    """
+    Serve a failed Discovery Engine search from the local vector index, if
+    one is loaded. Filtered searches are not supported by the vector index.
+    """
+    vector_search = app.extensions['vector_search']
+    if 'error' not in search_results or vector_search is None or params.filters:
+        return search_results
+    if not app.config.get('VECTOR_FALLBACK_ENABLED'):
+        return search_results
+    app.logger.warning(f"Serving search from the vector index: {search_results['error']}")
+    fallback_results = vector_search.search(params.query, params.page_size, params.offset)
+    fallback_results['fallback'] = 'vector_index'
+    return fallback_results
+
+def cached_search(params: SearchParams):
+    """Search through the response cache, sharing one upstream call per query"""
+    # Page tokens are only valid with identical request settings, so every
+    # page uses the same template
+    include_summary = not app.config.get('DEFER_SUMMARY')
+    upstream_params = resolve_page_token(params)
+    search_results = app.extensions['search_cache'].get_or_compute(
+        search_cache_key(params, include_summary),
+        lambda: search_sample(upstream_params, include_summary=include_summary),
+        # Never cache failed searches
+        cacheable=lambda search_results: 'error' not in search_results,
+    )
+    remember_next_page(params, search_results)
+    return vector_fallback(params, search_results)
+
+def cached_summary(search_query: str):
+    """Summary through the response cache; concurrent requests share one call"""
+    key = make_cache_key(search_query, 0, kind='summary')
+    return app.extensions['search_cache'].get_or_compute(
+        key,
+        lambda: summary_sample(search_query),
+        cacheable=lambda summary: app.config.get('SUMMARY_CACHE_ENABLED') and 'error' not in summary,
+    )
+
+def prefetch_summary(params: SearchParams) -> bool:
+    """
+    Start generating the summary while the first page of results is returned,
+    so the client's /api/summary request joins the call already in flight.
+    Skipped when SUMMARY_MAX_PENDING prefetches are already queued or running;
+    /api/summary then generates the summary on demand.
+
+    Returns:
+        True if a prefetch was started
+    """
+    if not (app.config.get('DEFER_SUMMARY') and params.first_page):
+        return False
+    slots = app.extensions['summary_slots']
+    if not slots.acquire(blocking=False):
+        app.logger.debug(f"Summary prefetch backlog full, skipping: {params.query}")
+        return False
+    future = app.extensions['summary_executor'].submit(cached_summary, params.query)
+    future.add_done_callback(lambda _: slots.release())
+    return True
+
 @app.route('/')
 def index():
     """Home page with search interface"""
@@ -183,31 +254,76 @@ def index():
 @app.route('/search')
 def search():
     """Search endpoint"""
-    query = request.args.get('q', '').strip()
+    try:
+        params = parse_request_params(request.args.getlist)
+    except ValueError as e:
+        return render_template('index.html', error=str(e))
     
-    if not query:
+    if not params.query:
         return render_template('index.html', error="Please enter a search query")
     
     # Perform search
-    search_results = search_sample(query)
+    prefetch_summary(params)
+    search_results = cached_search(params)
     
     return render_template('results.html', 
-                         query=query,
+                         query=params.query,
                          results=search_results['results'],
                          summary=search_results.get('summary'),
+                         defer_summary=app.config.get('DEFER_SUMMARY'),
                          total_results=search_results['total_results'],
                          error=search_results.get('error'))
 
 @app.route('/api/search')
 def api_search():
-    """API endpoint for search"""
+    """
+    API endpoint for search. Supports paging with page / offset / page_token
+    and page_size, and filtering with persons, organizations, hash_tags and
+    media_type (repeatable).
+    """
+    try:
+        params = parse_request_params(request.args.getlist)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not params.query:
+        return jsonify({'error': 'Query parameter required'}), 400
+    
+    prefetch_summary(params)
+    search_results = cached_search(params)
+    return jsonify(search_results)
+
+@app.route('/api/vector_search')
+def api_vector_search():
+    """API endpoint for search against the local vector index only"""
+    vector_search = app.extensions['vector_search']
+    if vector_search is None:
+        return jsonify({'error': 'Vector index not configured'}), 404
+    
+    try:
+        params = parse_request_params(request.args.getlist)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not params.query:
+        return jsonify({'error': 'Query parameter required'}), 400
+    
+    return jsonify(vector_search.search(params.query, params.page_size, params.offset))
+
+@app.route('/api/summary')
+def api_summary():
+    """API endpoint for the search summary, fetched separately from the results"""
     query = request.args.get('q', '').strip()
     
     if not query:
         return jsonify({'error': 'Query parameter required'}), 400
     
-    search_results = search_sample(query)
-    return jsonify(search_results)
+    return jsonify(cached_summary(query))
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Search cache hit ratio and upstream latency saved"""
+    return jsonify(app.extensions['search_cache'].stats())
 
 @app.route('/health')
 def health_check():
@@ -221,4 +337,6 @@ def health_check():
 if __name__ == '__main__':
     # Get port from environment variable (Cloud Run sets PORT)
     port = int(os.environ.get('PORT', 3000))
+    if app.config.get('SEARCH_WARMUP'):
+        app.extensions['search_clients'].warm_up(build_warmup_operation_name(app.config))
     app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=port) 
\ No newline at end of file
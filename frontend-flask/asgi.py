@@ -0,0 +1,172 @@
+"""
+ASGI entry point: serves /api/search on the event loop with the async
+Discovery Engine client and hands every other route to the Flask app.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 8080
+"""
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from google.api_core import exceptions as api_exceptions
+from google.cloud import discoveryengine_v1 as discoveryengine
+from app import (
+    app as flask_app,
+    build_search_request,
+    format_search_response,
+    parse_request_params,
+    prefetch_summary,
+    remember_next_page_async,
+    resolve_page_token_async,
+    search_cache_key,
+    vector_fallback,
+)
+from search_client import SearchClientPool, build_warmup_operation_name
+
+class AsyncSearchApp:
+    """
+    Serves /api/search without tying up a thread per request. At most
+    `ASYNC_MAX_IN_FLIGHT` searches run at once; beyond that requests are shed
+    with 503 instead of queueing. Each request gets a deadline (the default
+    timeout, or a shorter `X-Request-Timeout` in seconds from the caller) that
+    bounds both the upstream RPC and the time spent waiting for it.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get('WSGI_THREADS', 8))
+        self.max_in_flight = flask_app.config.get('ASYNC_MAX_IN_FLIGHT', 256)
+        self.default_timeout = flask_app.config.get('SEARCH_TIMEOUT_SECONDS', 10.0)
+        self.in_flight = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.summary_prefetches_skipped = 0
+        self.clients = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == '/api/search':
+            await self._search(scope, send)
+        elif scope['type'] == 'http' and scope['path'] == '/api/async/stats':
+            await self._send_json(send, 200, self.stats())
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self._start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _start(self):
+        # Async clients are bound to the running event loop
+        self.clients = SearchClientPool(
+            self.flask_app.config['VERTEX_AI_LOCATION'],
+            self.flask_app.config.get('SEARCH_CLIENT_POOL_SIZE', 2),
+            client_class=discoveryengine.SearchServiceAsyncClient,
+        )
+        # Warm-up happens here rather than when the app is imported, so
+        # scripts and tests that import it make no RPCs
+        if self.flask_app.config.get('SEARCH_WARMUP'):
+            operation_name = build_warmup_operation_name(self.flask_app.config)
+            await self.clients.warm_up_async(operation_name, timeout=self.default_timeout)
+            # The Flask routes use the synchronous pool
+            await asyncio.to_thread(
+                self.flask_app.extensions['search_clients'].warm_up, operation_name, self.default_timeout,
+            )
+
+    def _request_timeout(self, scope) -> float:
+        for name, value in scope.get('headers', []):
+            if name == b'x-request-timeout':
+                try:
+                    return max(0.0, min(float(value), self.default_timeout))
+                except ValueError:
+                    break
+        return self.default_timeout
+
+    async def _search(self, scope, send):
+        query_string = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            params = parse_request_params(lambda name: query_string.get(name, []))
+        except ValueError as e:
+            await self._send_json(send, 400, {'error': str(e)})
+            return
+        if not params.query:
+            await self._send_json(send, 400, {'error': 'Query parameter required'})
+            return
+
+        if self.in_flight >= self.max_in_flight:
+            self.shed += 1
+            await self._send_json(send, 503, {'error': 'Server busy, retry shortly'}, retry_after=1)
+            return
+
+        deadline = time.monotonic() + self._request_timeout(scope)
+        self.in_flight += 1
+        try:
+            if self.flask_app.config.get('DEFER_SUMMARY') and params.first_page and not prefetch_summary(params):
+                self.summary_prefetches_skipped += 1
+            status, body = await self._cached_search(params, deadline)
+        finally:
+            self.in_flight -= 1
+        await self._send_json(send, status, body)
+
+    async def _cached_search(self, params, deadline: float):
+        include_summary = not self.flask_app.config.get('DEFER_SUMMARY')
+        upstream_params = await resolve_page_token_async(params)
+
+        async def compute():
+            remaining = deadline - time.monotonic()
+            client = self.clients.get()
+            page_result = await client.search(
+                build_search_request(upstream_params, include_summary),
+                timeout=max(remaining, 0.001),
+            )
+            return format_search_response(upstream_params, page_result)
+
+        try:
+            search_results = await asyncio.wait_for(
+                self.flask_app.extensions['search_cache'].get_or_compute_async(
+                    search_cache_key(params, include_summary),
+                    compute,
+                ),
+                timeout=max(deadline - time.monotonic(), 0),
+            )
+            await remember_next_page_async(params, search_results)
+            return 200, search_results
+        except (asyncio.TimeoutError, api_exceptions.DeadlineExceeded):
+            self.timeouts += 1
+            status, search_results = 504, {'results': [], 'summary': None, 'facets': [], 'total_results': 0, 'error': 'Search timed out'}
+        except Exception as e:
+            self.flask_app.logger.error(f"Search error: {str(e)}")
+            status, search_results = 200, {'results': [], 'summary': None, 'facets': [], 'total_results': 0, 'error': str(e)}
+        # Query embedding may call out to Vertex AI, so keep it off the event loop
+        search_results = await asyncio.to_thread(vector_fallback, params, search_results)
+        return (status if 'error' in search_results else 200), search_results
+
+    async def _send_json(self, send, status: int, payload: dict, retry_after: int = None):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+        ]
+        if retry_after is not None:
+            headers.append((b'retry-after', str(retry_after).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'shed': self.shed,
+            'timeouts': self.timeouts,
+            'summary_prefetches_skipped': self.summary_prefetches_skipped,
+        }
+
+app = AsyncSearchApp(flask_app)
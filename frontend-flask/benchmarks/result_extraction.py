@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of per-page search result extraction.
+
+Compares `search_results.extract_results` with the previous approach
+(proto-plus dict copies and INFO logging per result) on synthetic pages.
+
+Usage: python benchmarks/result_extraction.py [--page_size 20] [--iterations 2000]
+"""
+import io
+import os
+import sys
+import time
+import logging
+import argparse
+from google.cloud import discoveryengine_v1 as discoveryengine
+from google.protobuf import struct_pb2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_results import extract_results
+
+def build_page(page_size: int) -> list:
+    results = []
+    for i in range(page_size):
+        struct_data = struct_pb2.Struct()
+        struct_data.update({
+            'title': f"Match highlight {i}",
+            'video_src': f"gs://bucket/processed-segments/match_segment_{i:03d}.mp4",
+            'description': "Segment from match.mp4 at 120s",
+            'document_transcript': "Commentary " * 50,
+            'persons': ["Player A", "Player B"],
+            'hash_tags': ["#goal", "#soccer"],
+        })
+        derived = struct_pb2.Struct()
+        derived.update({'snippets': [{'snippet': f"... goal scored {i} ..."}]})
+        results.append(discoveryengine.SearchResponse.SearchResult(
+            id=str(i),
+            document=discoveryengine.Document(
+                id=f"doc-{i}",
+                struct_data=struct_data,
+                derived_struct_data=derived,
+            ),
+        ))
+    return results
+
+def legacy_extract(results, logger) -> list:
+    """The per-result extraction previously done inline in search_sample"""
+    extracted = []
+    for result in results:
+        logger.info(f"Processing result: {type(result)}")
+        document = result.document
+        result_data = {'id': document.id or 'unknown', 'title': 'Untitled Video', 'snippet': '', 'uri': '', 'thumbnail': ''}
+        if document.struct_data:
+            struct_data = dict(document.struct_data)
+            logger.info(f"Struct data keys: {list(struct_data.keys())}")
+            result_data['title'] = struct_data.get('video_title', '') or struct_data.get('title', '') or struct_data.get('name', '') or 'Untitled Video'
+            result_data['uri'] = struct_data.get('video_src', '') or struct_data.get('uri', '') or struct_data.get('url', '') or struct_data.get('link', '')
+            result_data['snippet'] = struct_data.get('video_desc', '') or struct_data.get('document_description', '') or struct_data.get('description', '') or struct_data.get('snippet', '') or struct_data.get('document_transcript', '') or ''
+        if document.derived_struct_data:
+            derived_data = dict(document.derived_struct_data)
+            logger.info(f"Derived data keys: {list(derived_data.keys())}")
+        logger.info(f"Final result data: {result_data}")
+        extracted.append(result_data)
+    return extracted
+
+def time_per_page(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search result extraction.")
+    parser.add_argument("--page_size", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = build_page(args.page_size)
+
+    # Log to memory so the legacy path pays for formatting, not terminal I/O
+    logger = logging.getLogger("legacy-extraction")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+    logger.propagate = False
+
+    legacy = time_per_page(lambda: legacy_extract(results, logger), args.iterations)
+    lean = time_per_page(lambda: extract_results(results), args.iterations)
+
+    print(f"Page size: {args.page_size}, iterations: {args.iterations}")
+    print(f"Legacy extraction: {legacy * 1e6:.1f} us/page")
+    print(f"Lean extraction:   {lean * 1e6:.1f} us/page ({legacy / lean:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,46 @@ class Config:
     # Search Configuration
     DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '10'))
     MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '20'))
+    # Log every search result; too costly to leave on in production
+    SEARCH_DEBUG_LOGGING = os.environ.get('SEARCH_DEBUG_LOGGING', 'False').lower() == 'true'
+    
+    # Search Client Configuration
+    SEARCH_CLIENT_POOL_SIZE = int(os.environ.get('SEARCH_CLIENT_POOL_SIZE', '2'))
+    # Open the search channels at server startup, with an unbilled operation
+    # lookup rather than a search, instead of on the first request
+    SEARCH_WARMUP = os.environ.get('SEARCH_WARMUP', 'True').lower() == 'true'
+    
+    # Opt-in: return results without the summary (it is null in /api/search
+    # responses); clients fetch it from /api/summary
+    DEFER_SUMMARY = os.environ.get('DEFER_SUMMARY', 'False').lower() == 'true'
+    SUMMARY_CACHE_ENABLED = os.environ.get('SUMMARY_CACHE_ENABLED', 'True').lower() == 'true'
+    SUMMARY_WORKERS = int(os.environ.get('SUMMARY_WORKERS', '4'))
+    # Prefetches queued or running at once; beyond this they are skipped and
+    # /api/summary generates the summary on demand
+    SUMMARY_MAX_PENDING = int(os.environ.get('SUMMARY_MAX_PENDING', '16'))
+    
+    # Async Serving Configuration (asgi.py)
+    # Searches allowed in flight before /api/search sheds load with 503
+    ASYNC_MAX_IN_FLIGHT = int(os.environ.get('ASYNC_MAX_IN_FLIGHT', '256'))
+    # Default per-request deadline; callers may ask for less with X-Request-Timeout
+    SEARCH_TIMEOUT_SECONDS = float(os.environ.get('SEARCH_TIMEOUT_SECONDS', '10'))
+    # Threads serving the remaining Flask routes
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS', '8'))
+    
+    # Vector Index Configuration
+    # Directory of a vector index built by the indexing pipeline; empty disables vector search
+    VECTOR_INDEX_DIR = os.environ.get('VECTOR_INDEX_DIR', '')
+    VECTOR_SEARCH_NPROBE = int(os.environ.get('VECTOR_SEARCH_NPROBE', '8'))
+    # Serve searches from the vector index when Discovery Engine fails
+    VECTOR_FALLBACK_ENABLED = os.environ.get('VECTOR_FALLBACK_ENABLED', 'True').lower() == 'true'
+    
+    # Search Cache Configuration
+    SEARCH_CACHE_TTL_SECONDS = int(os.environ.get('SEARCH_CACHE_TTL_SECONDS', '300'))
+    SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '1024'))
+    # Set to share the cache between instances, e.g. redis://10.0.0.3:6379/0
+    REDIS_URL = os.environ.get('REDIS_URL')
+    # Redis errors are treated as cache misses; keep them fast
+    REDIS_TIMEOUT_SECONDS = float(os.environ.get('REDIS_TIMEOUT_SECONDS', '0.5'))
     
     @classmethod
     def get_vertex_ai_config(cls) -> dict:
@@ -51,6 +91,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     DEBUG = True
+    SEARCH_WARMUP = False
 
 # Configuration dictionary
 config = {
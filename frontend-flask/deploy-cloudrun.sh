@@ -31,7 +31,7 @@ gcloud run deploy ${SERVICE_NAME} \
     --cpu 1 \
     --max-instances 10 \
     --min-instances 0 \
-    --concurrency 80 \
+    --concurrency 250 \
     --timeout 300 \
     --set-env-vars "FLASK_ENV=production" \
     --set-env-vars "GOOGLE_CLOUD_PROJECT=${PROJECT_ID}" \
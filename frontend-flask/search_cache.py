@@ -0,0 +1,279 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for REDIS_URL
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry"""
+    return ' '.join(query.lower().split())
+
+
+def make_cache_key(query: str, page_size: int, filters=None, kind: str = 'search', page=None, normalize: bool = True) -> str:
+    """
+    Build a cache key from the kind of response, query (normalized unless
+    `normalize` is false), page size, filters and position in the result
+    list (e.g. an offset)
+    """
+    return json.dumps(
+        [kind, normalize_query(query) if normalize else query, page_size, filters or {}, page],
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL"""
+
+    # Calls never wait on I/O, so the async path makes them inline
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Cache backend for any Redis-compatible client (get / set with `ex`), so
+    several instances can share one cache. Tests can pass a local stand-in.
+    """
+
+    # Calls wait on the network, so the async path runs them in a thread
+    blocking = True
+
+    def __init__(self, client, prefix: str = 'search:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.latency = 0.0
+
+
+class SearchCache:
+    """
+    Caches search responses and coalesces concurrent identical requests so
+    they share a single upstream call.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'upstream_calls': 0,
+            'upstream_seconds': 0.0,
+            'saved_seconds': 0.0,
+            'backend_errors': 0,
+        }
+
+    def _record(self, **increments):
+        with self._lock:
+            for name, amount in increments.items():
+                self._stats[name] += amount
+
+    # A cache outage must not fail searches: backend errors count as misses
+    # and failed writes are dropped.
+    def _backend_get(self, key: str):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self._record(backend_errors=1)
+            logger.warning(f"Search cache read failed, treating as a miss: {e}")
+            return None
+
+    def _backend_set(self, key: str, entry: dict):
+        try:
+            self.backend.set(key, entry, self.ttl)
+        except Exception as e:
+            self._record(backend_errors=1)
+            logger.warning(f"Search cache write failed, not caching: {e}")
+
+    async def _backend_get_async(self, key: str):
+        if getattr(self.backend, 'blocking', True):
+            return await asyncio.to_thread(self._backend_get, key)
+        return self._backend_get(key)
+
+    async def _backend_set_async(self, key: str, entry: dict):
+        if getattr(self.backend, 'blocking', True):
+            await asyncio.to_thread(self._backend_set, key, entry)
+        else:
+            self._backend_set(key, entry)
+
+    def get_or_compute(self, key: str, compute, cacheable=lambda value: True):
+        """
+        Return the cached value for `key`, or call `compute()` once no matter
+        how many callers ask for the same key concurrently. Only values for
+        which `cacheable(value)` is true are stored.
+        """
+        # Entries keep the latency of the upstream call that produced them so
+        # hits can report how much time they saved.
+        entry = self._backend_get(key)
+        if entry is not None:
+            self._record(hits=1, saved_seconds=entry['upstream_seconds'])
+            return entry['value']
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            self._record(coalesced=1, saved_seconds=flight.latency)
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        self._record(misses=1)
+        start = time.monotonic()
+        try:
+            flight.value = compute()
+            flight.latency = time.monotonic() - start
+            self._record(upstream_calls=1, upstream_seconds=flight.latency)
+            if cacheable(flight.value):
+                self._backend_set(key, {'value': flight.value, 'upstream_seconds': flight.latency})
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_compute_async(self, key: str, compute, cacheable=lambda value: True):
+        """
+        Async counterpart of `get_or_compute` for use on an event loop:
+        `compute` is a coroutine function, and concurrent callers await the
+        same task. A caller that is cancelled (e.g. by its deadline) does not
+        cancel the shared upstream call. Backend calls that wait on I/O run in
+        a thread so they do not block the event loop.
+        """
+        entry = await self._backend_get_async(key)
+        if entry is not None:
+            self._record(hits=1, saved_seconds=entry['upstream_seconds'])
+            return entry['value']
+
+        task = self._async_flights.get(key)
+        if task is not None:
+            value, latency = await asyncio.shield(task)
+            self._record(coalesced=1, saved_seconds=latency)
+            return value
+
+        self._record(misses=1)
+        task = asyncio.ensure_future(self._compute_async(key, compute, cacheable))
+        self._async_flights[key] = task
+        task.add_done_callback(lambda done: self._finish_async_flight(key, done))
+        value, _ = await asyncio.shield(task)
+        return value
+
+    async def _compute_async(self, key: str, compute, cacheable):
+        start = time.monotonic()
+        value = await compute()
+        latency = time.monotonic() - start
+        self._record(upstream_calls=1, upstream_seconds=latency)
+        if cacheable(value):
+            await self._backend_set_async(key, {'value': value, 'upstream_seconds': latency})
+        return value, latency
+
+    def _finish_async_flight(self, key: str, task):
+        self._async_flights.pop(key, None)
+        # Retrieve the exception so it is not reported as unhandled when every
+        # waiter has already given up
+        if not task.cancelled():
+            task.exception()
+
+    def remember(self, key: str, value):
+        """Store a value that was not produced by an upstream search, e.g. a page token"""
+        self._backend_set(key, {'value': value, 'upstream_seconds': 0.0})
+
+    def recall(self, key: str):
+        entry = self._backend_get(key)
+        return entry['value'] if entry is not None else None
+
+    async def remember_async(self, key: str, value):
+        """Async counterpart of `remember`"""
+        await self._backend_set_async(key, {'value': value, 'upstream_seconds': 0.0})
+
+    async def recall_async(self, key: str):
+        """Async counterpart of `recall`"""
+        entry = await self._backend_get_async(key)
+        return entry['value'] if entry is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        stats['avg_upstream_seconds'] = (
+            stats['upstream_seconds'] / stats['upstream_calls'] if stats['upstream_calls'] else 0.0
+        )
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+def create_search_cache(app_config) -> SearchCache:
+    """Create the search cache described by the app configuration"""
+    redis_url = app_config.get('REDIS_URL')
+    if redis_url:
+        if redis is None:
+            raise RuntimeError('REDIS_URL is set but the redis package is not installed')
+        # Short timeouts so an unreachable Redis degrades to cache misses
+        # instead of stalling every search
+        timeout = app_config.get('REDIS_TIMEOUT_SECONDS', 0.5)
+        backend = RedisBackend(
+            redis.Redis.from_url(redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        )
+    else:
+        backend = MemoryBackend(app_config.get('SEARCH_CACHE_MAX_ENTRIES', 1024))
+    return SearchCache(backend, ttl=app_config.get('SEARCH_CACHE_TTL_SECONDS', 300))
@@ -0,0 +1,155 @@
+import itertools
+import logging
+import threading
+from google.api_core import exceptions as api_exceptions
+from google.api_core.client_options import ClientOptions
+from google.cloud import discoveryengine_v1 as discoveryengine
+
+logger = logging.getLogger(__name__)
+
+# Warm-up looks up this (nonexistent) long-running operation: an unbilled
+# RPC that goes through the same channel and credentials as a search but
+# does not count as a query in billing, analytics or personalization
+WARMUP_OPERATION = 'warmup'
+# Answers that prove the round trip worked
+WARMUP_RESPONSES = (api_exceptions.NotFound, api_exceptions.InvalidArgument)
+
+# Number of top results the summary is generated from
+SUMMARY_RESULT_COUNT = 5
+
+# Facets returned with search results, as (struct_data field, value limit)
+FACETS = (
+    ('persons.name', 20),
+    ('organizations.name', 20),
+    ('hash_tags', 50),
+    ('media_type', 10),
+)
+
+def build_serving_config(app_config) -> str:
+    """Full resource name of the search app serving config"""
+    return (
+        f"projects/{app_config['GOOGLE_CLOUD_PROJECT']}/locations/{app_config['VERTEX_AI_LOCATION']}"
+        f"/collections/default_collection/engines/{app_config['VERTEX_AI_ENGINE_ID']}"
+        f"/servingConfigs/default_config"
+    )
+
+def build_warmup_operation_name(app_config) -> str:
+    """Name of the operation looked up to warm up search clients"""
+    serving_config = build_serving_config(app_config)
+    return f"{serving_config.rsplit('/servingConfigs/', 1)[0]}/operations/{WARMUP_OPERATION}"
+
+def build_search_template(
+    app_config,
+    include_summary: bool = True,
+    include_facets: bool = True,
+    page_size: int = None,
+) -> discoveryengine.SearchRequest:
+    """
+    Build the parts of a search request that are the same for every query.
+    Per-request fields are merged in with `discoveryengine.SearchRequest(template, query=...)`,
+    which copies the template.
+    """
+    summary_spec = None
+    if include_summary:
+        summary_spec = discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec(
+            summary_result_count=SUMMARY_RESULT_COUNT,
+            include_citations=True,
+            ignore_adversarial_query=True,
+            ignore_non_summary_seeking_query=True,
+            model_prompt_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec.ModelPromptSpec(
+                preamble="Provide a brief summary of the video content."
+            ),
+            model_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec.ModelSpec(
+                version="stable",
+            ),
+        )
+    content_search_spec = discoveryengine.SearchRequest.ContentSearchSpec(
+        snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
+            return_snippet=True
+        ),
+        summary_spec=summary_spec,
+    )
+    facet_specs = []
+    if include_facets:
+        facet_specs = [
+            discoveryengine.SearchRequest.FacetSpec(
+                facet_key=discoveryengine.SearchRequest.FacetSpec.FacetKey(key=key),
+                limit=limit,
+            )
+            for key, limit in FACETS
+        ]
+
+    return discoveryengine.SearchRequest(
+        serving_config=build_serving_config(app_config),
+        page_size=page_size or app_config.get('DEFAULT_PAGE_SIZE', 10),
+        content_search_spec=content_search_spec,
+        facet_specs=facet_specs,
+        query_expansion_spec=discoveryengine.SearchRequest.QueryExpansionSpec(
+            condition=discoveryengine.SearchRequest.QueryExpansionSpec.Condition.AUTO,
+        ),
+        spell_correction_spec=discoveryengine.SearchRequest.SpellCorrectionSpec(
+            mode=discoveryengine.SearchRequest.SpellCorrectionSpec.Mode.AUTO
+        ),
+    )
+
+def build_search_templates(app_config) -> dict:
+    """
+    Request templates by kind:
+    - 'inline': results and summary in one call
+    - 'results': results only, returned without waiting for the summary
+    - 'summary': just enough results to generate the summary
+    """
+    return {
+        'inline': build_search_template(app_config),
+        'results': build_search_template(app_config, include_summary=False),
+        'summary': build_search_template(app_config, include_facets=False, page_size=SUMMARY_RESULT_COUNT),
+    }
+
+class SearchClientPool:
+    """
+    Long-lived SearchServiceClients shared by all requests. Each client owns
+    its own gRPC channel; requests are spread over them round-robin.
+    Pass `client_class=discoveryengine.SearchServiceAsyncClient` for a pool
+    of async clients, which must be created on the event loop that uses them.
+    """
+
+    def __init__(self, location: str, size: int, client_class=discoveryengine.SearchServiceClient):
+        client_options = (
+            ClientOptions(api_endpoint=f"{location}-discoveryengine.googleapis.com")
+            if location != "global"
+            else None
+        )
+        self.clients = [
+            client_class(client_options=client_options)
+            for _ in range(max(1, size))
+        ]
+        self._next = itertools.cycle(self.clients)
+        self._lock = threading.Lock()
+
+    def get(self) -> discoveryengine.SearchServiceClient:
+        with self._lock:
+            return next(self._next)
+
+    def warm_up(self, operation_name: str, timeout: float = 10.0):
+        """
+        Open every channel and fetch credentials with an operation lookup
+        (see WARMUP_OPERATION), so the first real request does not pay for
+        connection setup. Call once at server startup.
+        """
+        for client in self.clients:
+            try:
+                client.get_operation({'name': operation_name}, timeout=timeout)
+            except WARMUP_RESPONSES:
+                pass
+            except Exception as e:
+                logger.warning(f"Search client warm-up failed: {e}")
+
+    async def warm_up_async(self, operation_name: str, timeout: float = 10.0):
+        """`warm_up` for a pool of async clients"""
+        for client in self.clients:
+            try:
+                await client.get_operation({'name': operation_name}, timeout=timeout)
+            except WARMUP_RESPONSES:
+                pass
+            except Exception as e:
+                logger.warning(f"Async search client warm-up failed: {e}")
@@ -0,0 +1,76 @@
+from typing import NamedTuple
+
+# Filterable struct_data fields written by the indexing pipeline, by request
+# parameter. The facet keys returned by Discovery Engine are accepted too, so
+# a facet value can be passed back as a filter as-is.
+FILTER_FIELDS = {
+    'persons': 'persons.name',
+    'organizations': 'organizations.name',
+    'hash_tags': 'hash_tags',
+    'media_type': 'media_type',
+}
+FILTER_PARAMS = {**FILTER_FIELDS, **{field: field for field in FILTER_FIELDS.values()}}
+
+class SearchParams(NamedTuple):
+    query: str
+    page_size: int
+    offset: int = 0
+    page_token: str = ''
+    filters: dict = {}
+
+    @property
+    def first_page(self) -> bool:
+        return self.offset == 0 and not self.page_token
+
+def _int_param(get_all, name: str, default: int) -> int:
+    values = get_all(name)
+    if not values or not values[0].strip():
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise ValueError(f"Parameter '{name}' must be an integer")
+
+def parse_search_params(get_all, default_page_size: int, max_page_size: int) -> SearchParams:
+    """
+    Parse search parameters from a query string. `get_all(name)` returns all
+    values of a parameter (e.g. Flask's `request.args.getlist`).
+
+    Supported parameters: q, page_size, page (1-based) or offset, page_token,
+    and repeatable filters (persons, organizations, hash_tags, media_type).
+
+    Raises:
+        ValueError: If a numeric parameter is invalid.
+    """
+    query = (get_all('q') or [''])[0].strip()
+    page_size = min(max(_int_param(get_all, 'page_size', default_page_size), 1), max_page_size)
+
+    page = _int_param(get_all, 'page', 0)
+    offset = (page - 1) * page_size if page > 0 else _int_param(get_all, 'offset', 0)
+    if offset < 0:
+        raise ValueError("Parameter 'offset' must not be negative")
+
+    filters = {}
+    for param, field in FILTER_PARAMS.items():
+        values = [value for value in get_all(param) if value]
+        if values:
+            filters.setdefault(field, set()).update(values)
+
+    return SearchParams(
+        query=query,
+        page_size=page_size,
+        offset=offset,
+        page_token=(get_all('page_token') or [''])[0],
+        filters={field: sorted(values) for field, values in sorted(filters.items())},
+    )
+
+def build_filter_expression(filters: dict) -> str:
+    """
+    Discovery Engine filter matching any of the values of a field, and all of
+    the filtered fields.
+    """
+    clauses = []
+    for field, values in filters.items():
+        quoted = ', '.join('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values)
+        clauses.append(f'{field}: ANY({quoted})')
+    return ' AND '.join(clauses)
@@ -0,0 +1,60 @@
+from typing import NamedTuple
+
+# struct_data fields checked, in order, for each value shown in the UI
+TITLE_FIELDS = ('video_title', 'title', 'name')
+URI_FIELDS = ('video_src', 'uri', 'url', 'link')
+SNIPPET_FIELDS = (
+    'video_desc',
+    'document_description',
+    'description',
+    'snippet',
+    'document_transcript',
+)
+
+DEFAULT_TITLE = 'Untitled Video'
+NO_SNIPPET = "No snippet is available for this page."
+
+class SearchResult(NamedTuple):
+    id: str
+    title: str
+    snippet: str
+    uri: str
+    thumbnail: str = ''  # The frontend shows a placeholder
+
+def _first_string(fields, names) -> str:
+    for name in names:
+        value = fields.get(name)
+        if value is not None and value.string_value:
+            return value.string_value
+    return ''
+
+def _derived_snippet(derived_fields) -> str:
+    snippets = derived_fields.get('snippets')
+    if snippets is None:
+        return ''
+    for item in snippets.list_value.values:
+        snippet = item.struct_value.fields.get('snippet')
+        if snippet is not None and snippet.string_value and snippet.string_value != NO_SNIPPET:
+            return snippet.string_value
+    return ''
+
+def extract_result(result) -> SearchResult:
+    """
+    Map one search result to the fields the UI needs. Reads the underlying
+    protobuf Structs directly instead of converting them to dicts.
+    """
+    document = getattr(result, '_pb', result).document
+    fields = document.struct_data.fields
+    snippet = _first_string(fields, SNIPPET_FIELDS)
+    if not snippet:
+        snippet = _derived_snippet(document.derived_struct_data.fields)
+    return SearchResult(
+        id=document.id or 'unknown',
+        title=_first_string(fields, TITLE_FIELDS) or DEFAULT_TITLE,
+        snippet=snippet,
+        uri=_first_string(fields, URI_FIELDS),
+    )
+
+def extract_results(results) -> list[dict]:
+    """Map a page of search results to JSON-ready dicts"""
+    return [extract_result(result)._asdict() for result in results]
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+# Index files written by the indexing pipeline (indexing/python/vector_index.py)
+META_FILE = 'meta.json'
+VECTORS_FILE = 'vectors.npy'
+RECORDS_FILE = 'records.jsonl'
+CENTROIDS_FILE = 'centroids.npy'
+LIST_OFFSETS_FILE = 'list_offsets.npy'
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32)
+
+class HashingEmbedder:
+    """
+    Local feature-hashing embedder, identical to the one in the indexing
+    pipeline. Lets search run and be tested without any cloud service.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.name = f"hashing:{dimensions}"
+
+    def embed_query(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        return _normalize(vector)
+
+class GeminiEmbedder:
+    """Embeds queries with the Vertex AI embedding model used at indexing time"""
+
+    def __init__(self, project_id: str, model: str, dimensions: int):
+        from google import genai
+        from google.genai.types import EmbedContentConfig
+
+        self.client = genai.Client(project=project_id, location='global', vertexai=True)
+        self.model = model
+        self.dimensions = dimensions
+        self.config = EmbedContentConfig(task_type='RETRIEVAL_QUERY', output_dimensionality=dimensions)
+        self.name = f"gemini:{model}:{dimensions}"
+
+    def embed_query(self, text: str) -> np.ndarray:
+        response = self.client.models.embed_content(model=self.model, contents=[text], config=self.config)
+        return _normalize(np.array(response.embeddings[0].values, dtype=np.float32))
+
+def create_embedder(embedder_name: str, app_config):
+    """
+    Create the query embedder matching an index's embedder name, e.g.
+    'gemini:gemini-embedding-001:768' or 'hashing:768'.
+    """
+    kind, *parts = embedder_name.split(':')
+    if kind == 'hashing':
+        return HashingEmbedder(int(parts[0]))
+    if kind == 'gemini':
+        return GeminiEmbedder(app_config['GOOGLE_CLOUD_PROJECT'], parts[0], int(parts[1]))
+    raise ValueError(f"Unsupported embedder for vector index: {embedder_name}")
+
+class VectorIndex:
+    """
+    Read-only view of a vector index directory. Vectors are memory-mapped,
+    so only the rows a search touches are paged in. Flat indexes are
+    searched exhaustively; IVF indexes only scan the `nprobe` lists whose
+    centroids are closest to the query.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode='r')
+        with open(os.path.join(directory, RECORDS_FILE)) as f:
+            self.records = [json.loads(line) for line in f]
+        self.centroids = None
+        self.list_offsets = None
+        if self.meta['kind'] == 'ivf':
+            self.centroids = np.load(os.path.join(directory, CENTROIDS_FILE))
+            self.list_offsets = np.load(os.path.join(directory, LIST_OFFSETS_FILE))
+
+    @classmethod
+    def load(cls, directory: str):
+        """Load the index in `directory`, or return None if there is none"""
+        if not directory or not os.path.exists(os.path.join(directory, META_FILE)):
+            return None
+        return cls(directory)
+
+    @property
+    def embedder_name(self) -> str:
+        return self.meta['embedder']
+
+    def __len__(self):
+        return len(self.records)
+
+    def _candidate_rows(self, query: np.ndarray, nprobe: int):
+        if self.centroids is None:
+            return None
+        lists = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        return np.concatenate([
+            np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists
+        ])
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = 8) -> list[tuple[float, dict]]:
+        """
+        Returns:
+            Up to `k` (cosine similarity, record) pairs, best first.
+        """
+        if not len(self.records):
+            return []
+        rows = self._candidate_rows(query, nprobe)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        if rows is not None:
+            return [(float(scores[i]), self.records[rows[i]]) for i in top]
+        return [(float(scores[i]), self.records[i]) for i in top]
+
+class VectorSearch:
+    """A vector index together with the embedder for its queries"""
+
+    def __init__(self, index: VectorIndex, embedder, nprobe: int):
+        self.index = index
+        self.embedder = embedder
+        self.nprobe = nprobe
+
+    def search(self, query: str, page_size: int, offset: int = 0) -> dict:
+        """Search results in the same JSON shape as the Discovery Engine path"""
+        matches = self.index.search(self.embedder.embed_query(query), offset + page_size, self.nprobe)
+        results = [
+            {
+                'id': record['id'],
+                'title': record['title'],
+                'snippet': record['snippet'],
+                'uri': record['uri'],
+                'thumbnail': '',
+                'score': score,
+            }
+            for score, record in matches[offset:]
+        ]
+        return {
+            'results': results,
+            'summary': None,
+            'facets': [],
+            'total_results': len(self.index),
+            'page_results': len(results),
+            'page_size': page_size,
+            'offset': offset,
+            'next_page_token': None,
+        }
+
+def create_vector_search(app_config):
+    """Load the configured vector index, or return None if there is none"""
+    index = VectorIndex.load(app_config.get('VECTOR_INDEX_DIR'))
+    if index is None:
+        return None
+    return VectorSearch(
+        index,
+        create_embedder(index.embedder_name, app_config),
+        nprobe=app_config.get('VECTOR_SEARCH_NPROBE', 8),
+    )
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import logging
+from typing import Callable, NamedTuple, Optional
+
+# Internal modules
+import config
+import storage_io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Terminal states of a batch prediction job.
+JOB_SUCCEEDED = "JOB_STATE_SUCCEEDED"
+JOB_FAILED_STATES = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+# Request label carrying the row number, so outputs (which may be written in
+# any order) can be matched back to their requests.
+ROW_LABEL = "row"
+
+class BatchRequest(NamedTuple):
+    prompt: str
+    gcs_uri: str
+    response_mime_type: Optional[str] = None
+
+class BatchResponse(NamedTuple):
+    text: Optional[str]
+    error: Optional[str] = None
+
+def _is_gcs(uri: str) -> bool:
+    return uri.startswith("gs://")
+
+def _split_gcs_uri(gcs_uri: str) -> tuple[str, str]:
+    bucket_name, _, blob_name = gcs_uri[5:].partition("/")
+    return bucket_name, blob_name
+
+def _write_text(uri: str, text: str):
+    if _is_gcs(uri):
+        bucket_name, blob_name = _split_gcs_uri(uri)
+        storage_io.get_client().bucket(bucket_name).blob(blob_name).upload_from_string(
+            text, content_type="application/jsonl"
+        )
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+        with open(uri, "w") as f:
+            f.write(text)
+
+def _read_jsonl_files(prefix_uri: str) -> list[str]:
+    """Returns the contents of a .jsonl file, or of every one under a prefix."""
+    if _is_gcs(prefix_uri):
+        bucket_name, prefix = _split_gcs_uri(prefix_uri)
+        blobs = storage_io.get_client().list_blobs(bucket_name, prefix=prefix)
+        return [blob.download_as_text() for blob in blobs if blob.name.endswith(".jsonl")]
+    if os.path.isfile(prefix_uri):
+        with open(prefix_uri) as f:
+            return [f.read()]
+    contents = []
+    for root, _, files in os.walk(prefix_uri):
+        for name in sorted(files):
+            if name.endswith(".jsonl"):
+                with open(os.path.join(root, name)) as f:
+                    contents.append(f.read())
+    return contents
+
+def render_request(row: int, request: BatchRequest) -> dict:
+    """Renders a request as a line of a batch prediction input file."""
+    generation_config = {}
+    if request.response_mime_type:
+        generation_config["responseMimeType"] = request.response_mime_type
+    return {
+        "request": {
+            "contents": [{
+                "role": "user",
+                "parts": [
+                    {"text": request.prompt},
+                    {"fileData": {"fileUri": request.gcs_uri, "mimeType": "video/mp4"}},
+                ],
+            }],
+            "generationConfig": generation_config,
+            "labels": {ROW_LABEL: str(row)},
+        }
+    }
+
+def parse_output_line(line: dict) -> tuple[Optional[int], BatchResponse]:
+    """
+    Returns:
+        The row number of a batch prediction output line and its response.
+    """
+    labels = line.get("request", {}).get("labels", {})
+    row = int(labels[ROW_LABEL]) if ROW_LABEL in labels else None
+    if line.get("status"):
+        return row, BatchResponse(None, str(line["status"]))
+    candidates = line.get("response", {}).get("candidates", [])
+    if not candidates:
+        return row, BatchResponse(None, "No candidates in response")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return row, BatchResponse("".join(part.get("text", "") for part in parts))
+
+class VertexBatchRunner:
+    """Runs batch prediction jobs on Vertex AI."""
+
+    def __init__(self, model: str = config.GEMINI_MODEL_NAME):
+        self.model = model
+
+    def submit(self, input_uri: str, output_uri: str) -> str:
+        # Imported here so the fake runner works without Vertex AI access.
+        import gemini_analyzer
+        from google.genai.types import CreateBatchJobConfig
+
+        job = gemini_analyzer.scheduler.call(
+            self.model,
+            gemini_analyzer.client.batches.create,
+            model=self.model,
+            src=input_uri,
+            config=CreateBatchJobConfig(dest=output_uri),
+        )
+        return job.name
+
+    def state(self, job_name: str) -> str:
+        import gemini_analyzer
+
+        job = gemini_analyzer.client.batches.get(name=job_name)
+        return getattr(job.state, "name", str(job.state))
+
+class FakeBatchRunner:
+    """
+    Completes jobs immediately and locally by answering every request with
+    `respond(request_line)`, writing outputs in the same format as Vertex AI.
+    Lets bulk mode be tested end to end without submitting real jobs.
+    """
+
+    def __init__(self, respond: Optional[Callable[[dict], str]] = None):
+        self.respond = respond or self.fake_analysis
+        self.jobs = 0
+
+    @staticmethod
+    def fake_analysis(request_line: dict) -> str:
+        parts = request_line["request"]["contents"][0]["parts"]
+        file_uri = next(part["fileData"]["fileUri"] for part in parts if "fileData" in part)
+        return json.dumps({
+            "description": f"Fake analysis of {os.path.basename(file_uri)}",
+            "persons": [],
+            "organizations": [],
+            "hash_tags": ["#FakeAnalysis"],
+        })
+
+    def submit(self, input_uri: str, output_uri: str) -> str:
+        output_lines = []
+        for content in _read_jsonl_files(input_uri):
+            for line in content.splitlines():
+                if not line.strip():
+                    continue
+                request_line = json.loads(line)
+                output_lines.append(json.dumps({
+                    "status": "",
+                    "request": request_line["request"],
+                    "response": {"candidates": [{"content": {"role": "model", "parts": [{"text": self.respond(request_line)}]}}]},
+                }))
+        _write_text(f"{output_uri.rstrip('/')}/predictions.jsonl", "\n".join(output_lines) + "\n")
+        self.jobs += 1
+        return f"fake-batch-job-{self.jobs}"
+
+    def state(self, job_name: str) -> str:
+        return JOB_SUCCEEDED
+
+def create_runner():
+    """Returns the job runner selected by BATCH_PREDICTION_RUNNER."""
+    if config.BATCH_PREDICTION_RUNNER == "vertex":
+        return VertexBatchRunner()
+    if config.BATCH_PREDICTION_RUNNER == "fake":
+        return FakeBatchRunner()
+    raise ValueError(f"Unknown BATCH_PREDICTION_RUNNER: {config.BATCH_PREDICTION_RUNNER}")
+
+def run_job(
+    runner,
+    requests: list[BatchRequest],
+    job_uri: str,
+    poll_seconds: float = config.BATCH_PREDICTION_POLL_SECONDS,
+) -> list[BatchResponse]:
+    """
+    Writes `requests` to `<job_uri>/input.jsonl`, runs them as one batch
+    prediction job with outputs under `<job_uri>/output/`, and waits for it.
+
+    Returns:
+        One response per request, in order; requests the job did not answer
+        get a response with an error.
+
+    Raises:
+        RuntimeError: If the job fails, is cancelled or expires.
+    """
+    input_uri = f"{job_uri}/input.jsonl"
+    output_uri = f"{job_uri}/output/"
+    _write_text(input_uri, "".join(json.dumps(render_request(row, request)) + "\n" for row, request in enumerate(requests)))
+
+    job_name = runner.submit(input_uri, output_uri)
+    logger.info(f"Submitted batch prediction job {job_name} with {len(requests)} requests")
+    start = time.time()
+    while True:
+        state = runner.state(job_name)
+        if state == JOB_SUCCEEDED:
+            break
+        if state in JOB_FAILED_STATES:
+            raise RuntimeError(f"Batch prediction job {job_name} ended in state {state}")
+        logger.info(f"Batch prediction job {job_name} is {state} after {time.time() - start:.0f}s")
+        time.sleep(poll_seconds)
+
+    responses = [BatchResponse(None, "Missing from job output") for _ in requests]
+    for content in _read_jsonl_files(output_uri):
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            row, response = parse_output_line(json.loads(line))
+            if row is not None and 0 <= row < len(requests):
+                responses[row] = response
+    failed = sum(response.text is None for response in responses)
+    logger.info(f"Batch prediction job {job_name} finished in {time.time() - start:.0f}s, {failed} of {len(requests)} requests failed")
+    return responses
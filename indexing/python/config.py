@@ -13,17 +13,153 @@ GCS_BUCKET = os.getenv("GCS_BUCKET", "your-gcs-bucket")
 # --- Vertex AI Configuration ---
 # The Multimodal model for video analysis.
 GEMINI_MODEL_NAME = "gemini-2.5-pro"
+# Request scheduling for all Gemini calls: per-model rate limit, retries with
+# exponential backoff on 429/5xx errors, and the upper bound of the adaptive
+# concurrency window (main_pipeline.py re-seeds and caps the window from
+# --concurrency).
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "6"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "2"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "60"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+
+# --- Result Cache Configuration ---
+# Gemini responses are cached by model, rendered prompt and video content hash,
+# so re-running the pipeline on the same video does not re-pay model calls.
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(".cache", "gemini_results.sqlite"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Optional GCS object (gs://bucket/path.sqlite) the cache is restored from and saved to.
+RESULT_CACHE_GCS_URI = os.getenv("RESULT_CACHE_GCS_URI", "")
+
+# --- Run Manifest Configuration ---
+# Per-video progress is checkpointed locally and, unless MANIFEST_GCS_PATH is
+# empty, mirrored to this folder inside GCS_BUCKET so `--resume` works on Cloud Run.
+MANIFEST_LOCAL_DIR = os.getenv("MANIFEST_LOCAL_DIR", os.path.join(".cache", "manifests"))
+MANIFEST_GCS_PATH = os.getenv("MANIFEST_GCS_PATH", "pipeline-manifests")
+# Segment updates within this many seconds of the last checkpoint are batched
+# into the next one; stage transitions (e.g. documents written) save at once.
+MANIFEST_SYNC_INTERVAL = float(os.getenv("MANIFEST_SYNC_INTERVAL", "30"))
 
 # --- Vertex AI Search (Discovery Engine) Configuration ---
 DATA_STORE_ID = os.getenv("GCP_DATA_STORE_ID", "your-datastore-id")
+# Documents are streamed into JSONL shards; a shard is uploaded once it holds
+# this many documents or bytes.
+JSONL_SHARD_MAX_DOCUMENTS = int(os.getenv("JSONL_SHARD_MAX_DOCUMENTS", "100"))
+JSONL_SHARD_MAX_BYTES = int(os.getenv("JSONL_SHARD_MAX_BYTES", str(64 * 1024 * 1024)))
+# How long to wait for an import operation to complete.
+IMPORT_TIMEOUT_SECONDS = float(os.getenv("IMPORT_TIMEOUT_SECONDS", "3600"))
 
 # --- Video Processing Configuration ---
 VIDEO_SEGMENT_DURATION = 15
 
+# Segments are fingerprinted from their keyframes before analysis; static
+# segments reuse the analysis of the previous segment and near-duplicates of an
+# earlier segment reuse its analysis. Off by default, as a reused analysis may
+# miss what changed (e.g. a score or a caption).
+SEGMENT_PREFILTER_ENABLED = os.getenv("SEGMENT_PREFILTER_ENABLED", "false").lower() == "true"
+# Mean per-keyframe Hamming distance (out of 64 bits) at or below which segments are duplicates.
+PREFILTER_DUPLICATE_MAX_DISTANCE = float(os.getenv("PREFILTER_DUPLICATE_MAX_DISTANCE", "6"))
+# Mean absolute pixel change (0-255) between keyframes at or below which a segment is static.
+PREFILTER_STATIC_MAX_MOTION = float(os.getenv("PREFILTER_STATIC_MAX_MOTION", "1.5"))
+
+# Maximum number of ffmpeg splits running at once across all videos.
+SPLIT_CONCURRENCY = int(os.getenv("SPLIT_CONCURRENCY", str(os.cpu_count() or 2)))
+
+# Segments are analyzed from low-resolution, low-frame-rate proxies (with
+# mono low-bitrate audio) instead of the full-quality copies, which are still
+# uploaded and used as the playback URI of the documents. Proxies are encoded
+# on the CPU, one single-threaded ffmpeg per segment, PROXY_WORKERS at once.
+PROXY_ENABLED = os.getenv("PROXY_ENABLED", "false").lower() == "true"
+PROXY_HEIGHT = int(os.getenv("PROXY_HEIGHT", "360"))
+PROXY_FPS = float(os.getenv("PROXY_FPS", "2"))
+PROXY_CRF = int(os.getenv("PROXY_CRF", "32"))
+PROXY_AUDIO_BITRATE = os.getenv("PROXY_AUDIO_BITRATE", "48k")
+PROXY_WORKERS = int(os.getenv("PROXY_WORKERS", str(os.cpu_count() or 2)))
+
+# --- Batch Configuration ---
+# Number of videos indexed at once by `main_pipeline.py --video_prefix`.
+BATCH_VIDEO_WORKERS = int(os.getenv("BATCH_VIDEO_WORKERS", "4"))
+
+# --- Video Context Configuration ---
+# The video type and global context come from one request over either the
+# "full" source video, a "low_res" view of it (low media resolution, sampled
+# at VIDEO_CONTEXT_FPS frames per second), or a "segments" sample of
+# VIDEO_CONTEXT_SAMPLE_SEGMENTS evenly spaced segments. Streaming runs use
+# "low_res" instead of "segments", since their segments are not known up front.
+# "full" is the default; the cheaper sources may miss entities (e.g. players'
+# names or jersey numbers) that the segment analyses rely on.
+VIDEO_CONTEXT_SOURCE = os.getenv("VIDEO_CONTEXT_SOURCE", "full")
+VIDEO_CONTEXT_FPS = float(os.getenv("VIDEO_CONTEXT_FPS", "0.5"))
+VIDEO_CONTEXT_SAMPLE_SEGMENTS = int(os.getenv("VIDEO_CONTEXT_SAMPLE_SEGMENTS", "8"))
+
+# --- Analysis Configuration ---
+# Maximum number of segment analysis requests kept in flight at once.
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+# Number of segments analyzed per Gemini request. Batching sends the
+# instructions and global context once per request instead of once per
+# segment; 1 analyzes every segment with its own request.
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "1"))
+
+# --- Batch Prediction Configuration ---
+# `main_pipeline.py --bulk` analyzes all segments with one Vertex AI batch
+# prediction job instead of interactive requests. Job inputs and outputs are
+# written under BATCH_PREDICTION_URI, a gs:// prefix (or, with the "fake"
+# runner, which answers locally without calling Vertex AI, a local directory).
+BATCH_PREDICTION_RUNNER = os.getenv("BATCH_PREDICTION_RUNNER", "vertex")
+BATCH_PREDICTION_URI = os.getenv("BATCH_PREDICTION_URI", f"gs://{GCS_BUCKET}/batch-prediction")
+BATCH_PREDICTION_POLL_SECONDS = float(os.getenv("BATCH_PREDICTION_POLL_SECONDS", "60"))
+
+# --- Storage I/O Configuration ---
+# Number of parallel upload workers and the size of the shared HTTP connection pool.
+STORAGE_UPLOAD_WORKERS = int(os.getenv("STORAGE_UPLOAD_WORKERS", "16"))
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", str(STORAGE_UPLOAD_WORKERS + 8)))
+# Files larger than this are uploaded as chunked resumable uploads.
+STORAGE_RESUMABLE_THRESHOLD = int(os.getenv("STORAGE_RESUMABLE_THRESHOLD", str(64 * 1024 * 1024)))
+# Must be a multiple of 256 KiB.
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(16 * 1024 * 1024)))
+
+# How ffmpeg reads the source video: "download" copies it to local disk first,
+# "url" streams it over HTTP range requests from a signed URL.
+SOURCE_READ_MODE = os.getenv("SOURCE_READ_MODE", "download")
+SIGNED_URL_EXPIRATION_MINUTES = int(os.getenv("SIGNED_URL_EXPIRATION_MINUTES", "240"))
+# Optional base URL of an HTTP server standing in for GCS reads (e.g. http://localhost:8000).
+GCS_READ_ENDPOINT = os.getenv("GCS_READ_ENDPOINT", "")
+
+# --- Embedding / Vector Index Configuration ---
+# Segment documents are embedded and written to a local vector index that the
+# search app can query without Discovery Engine.
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+# "gemini" calls EMBEDDING_MODEL_NAME; "hashing" is a local embedder for testing without cloud services.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "gemini-embedding-001")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+# Maximum number of distinct texts sent per embedding request, further capped
+# by what the model accepts (gemini-embedding-001 takes one text per request).
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# Embedding requests have their own rate limit and concurrency window,
+# separate from the GEMINI_* settings used for analysis; gemini-embedding-001
+# takes one text per request, so these bound how fast a video is embedded.
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "1500"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "16"))
+# Vectors are cached by embedder and text hash, so repeated texts (replays,
+# commercials) and re-runs are only embedded once.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+EMBEDDING_CACHE_GCS_URI = os.getenv("EMBEDDING_CACHE_GCS_URI", "")
+VECTOR_INDEX_LOCAL_DIR = os.getenv("VECTOR_INDEX_LOCAL_DIR", os.path.join(".cache", "vector-index"))
+# Folder inside GCS_BUCKET the index is mirrored to; empty keeps it local only.
+VECTOR_INDEX_GCS_PATH = os.getenv("VECTOR_INDEX_GCS_PATH", "vector-index")
+# Indexes with more vectors than this are partitioned into IVF lists.
+VECTOR_INDEX_IVF_THRESHOLD = int(os.getenv("VECTOR_INDEX_IVF_THRESHOLD", "20000"))
+
 # --- GCS Folder Configuration ---
 # The folder inside GCS_BUCKET where your source videos are located.
 VIDEO_INPUT_FOLDER = "videos"
 # The folder for processed 15-second video segments.
 PROCESSED_SEGMENTS_GCS_PATH = "processed-segments"
+# The folder for the low-resolution analysis proxies of the segments.
+PROXY_SEGMENTS_GCS_PATH = "processed-segments-proxy"
 # The folder for the final JSONL data to be imported.
 JSONL_GCS_PATH = "discovery-engine-data"
\ No newline at end of file
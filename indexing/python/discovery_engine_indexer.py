@@ -1,4 +1,8 @@
+import time
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
 from google.api_core.client_options import ClientOptions
 from google.cloud import discoveryengine
 
@@ -8,15 +12,87 @@ import config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def import_documents_from_gcs(gcs_uri: str):
+# Discovery Engine accepts at most 100 GCS input URIs per import request.
+MAX_INPUT_URIS_PER_IMPORT = 100
+
+_client = None
+_poller = None
+_lock = threading.Lock()
+
+class ImportResult(NamedTuple):
+    operation_names: list[str]
+    success_count: int
+    failure_count: int
+    error_samples: list[str]
+    latency: float
+    # Input URIs of the operations that finished with no failed documents.
+    succeeded_uris: list[str]
+
+def get_client() -> discoveryengine.DocumentServiceClient:
     """
-    Triggers the document import process in Vertex AI Search.
+    Returns the process-wide DocumentServiceClient, created on first use.
     """
-    client_options = ClientOptions(
-        api_endpoint=f"{config.REGION}-discoveryengine.googleapis.com"
+    global _client, _poller
+    with _lock:
+        if _client is None:
+            client_options = ClientOptions(
+                api_endpoint=f"{config.REGION}-discoveryengine.googleapis.com"
+            )
+            _client = discoveryengine.DocumentServiceClient(client_options=client_options)
+            _poller = ThreadPoolExecutor(max_workers=4, thread_name_prefix="import-poller")
+        return _client
+
+def _wait_for_imports(operations: list[tuple], start: float) -> ImportResult:
+    success_count = 0
+    failure_count = 0
+    error_samples = []
+    succeeded_uris = []
+    for operation, input_uris in operations:
+        succeeded = True
+        try:
+            response = operation.result(timeout=config.IMPORT_TIMEOUT_SECONDS)
+            if response.error_samples:
+                succeeded = False
+                error_samples.extend(status.message for status in response.error_samples)
+        except Exception as e:
+            logger.error(f"Import operation {operation.operation.name} failed. Error: {e}")
+            error_samples.append(str(e))
+            succeeded = False
+        metadata = operation.metadata
+        if metadata is not None:
+            success_count += metadata.success_count
+            failure_count += metadata.failure_count
+            if metadata.failure_count:
+                succeeded = False
+        if succeeded:
+            succeeded_uris.extend(input_uris)
+
+    result = ImportResult(
+        operation_names=[operation.operation.name for operation, _ in operations],
+        success_count=success_count,
+        failure_count=failure_count,
+        error_samples=error_samples,
+        latency=time.time() - start,
+        succeeded_uris=succeeded_uris,
+    )
+    logger.info(
+        f"Import finished in {result.latency:.1f}s: "
+        f"{result.success_count} documents succeeded, {result.failure_count} failed."
     )
-    client = discoveryengine.DocumentServiceClient(client_options=client_options)
+    for message in error_samples:
+        logger.warning(f"Import error sample: {message}")
+    return result
+
+def import_documents(gcs_uris: list[str]) -> Future:
+    """
+    Imports JSONL files into Vertex AI Search using as few import operations
+    as possible, with INCREMENTAL reconciliation.
 
+    Returns:
+        A future that resolves to an `ImportResult` once all operations have
+        completed; the operations are polled in the background.
+    """
+    client = get_client()
     parent = client.branch_path(
         project=config.PROJECT_ID,
         location=config.REGION,
@@ -24,18 +100,27 @@ def import_documents_from_gcs(gcs_uri: str):
         branch="default_branch",
     )
 
-    request = discoveryengine.ImportDocumentsRequest(
-        parent=parent,
-        gcs_source=discoveryengine.GcsSource(input_uris=[gcs_uri]),
-        reconciliation_mode=discoveryengine.ImportDocumentsRequest.ReconciliationMode.INCREMENTAL,
-    )
-
-    try:
-        operation = client.import_documents(request=request)
-        logger.info(f"Started document import operation: {operation.operation.name}")
-        logger.info(
-            "You can monitor the import progress in the Google Cloud Console under Vertex AI Search."
+    start = time.time()
+    operations = []
+    for i in range(0, len(gcs_uris), MAX_INPUT_URIS_PER_IMPORT):
+        input_uris = gcs_uris[i:i + MAX_INPUT_URIS_PER_IMPORT]
+        request = discoveryengine.ImportDocumentsRequest(
+            parent=parent,
+            gcs_source=discoveryengine.GcsSource(input_uris=input_uris),
+            reconciliation_mode=discoveryengine.ImportDocumentsRequest.ReconciliationMode.INCREMENTAL,
         )
-    except Exception as e:
-        logger.error(f"Failed to start document import. Error: {e}")
-        raise
+        try:
+            operation = client.import_documents(request=request)
+            logger.info(f"Started document import operation: {operation.operation.name}")
+        except Exception as e:
+            logger.error(f"Failed to start document import. Error: {e}")
+            raise
+        operations.append((operation, input_uris))
+
+    return _poller.submit(_wait_for_imports, operations, start)
+
+def import_documents_from_gcs(gcs_uri: str) -> Future:
+    """
+    Triggers the document import process in Vertex AI Search.
+    """
+    return import_documents([gcs_uri])
@@ -0,0 +1,98 @@
+import os
+import json
+import uuid
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+# Internal modules
+import storage_io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DocumentSink:
+    """
+    Writes documents to local JSONL shards as soon as they are produced and
+    uploads each shard to GCS in the background once it holds
+    `max_documents` documents or `max_bytes` bytes, so memory use does not
+    grow with the number of documents and completed shards land in GCS while
+    the run is still going.
+
+    Each document may carry an opaque `key`; `on_shard_uploaded(uri, keys)`
+    is called from the upload thread with the keys of the documents in each
+    uploaded shard.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        gcs_path: str,
+        name_prefix: str,
+        max_documents: int,
+        max_bytes: int,
+        on_shard_uploaded: Optional[Callable[[str, list], None]] = None,
+    ):
+        self.bucket_name = bucket_name
+        self.gcs_path = gcs_path
+        self.name_prefix = name_prefix
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.on_shard_uploaded = on_shard_uploaded
+        self.document_count = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="document-sink")
+        self._uploads = []
+        self._file = None
+        self._keys = []
+        self._bytes = 0
+
+    def write(self, document: dict, key=None):
+        line = (json.dumps(document) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is not None and (
+                len(self._keys) >= self.max_documents or self._bytes + len(line) > self.max_bytes
+            ):
+                self._roll_over()
+            if self._file is None:
+                self._file = tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=".jsonl")
+            self._file.write(line)
+            self._keys.append(key)
+            self._bytes += len(line)
+            self.document_count += 1
+
+    def _roll_over(self):
+        local_path = self._file.name
+        self._file.close()
+        keys = self._keys
+        self._file, self._keys, self._bytes = None, [], 0
+
+        blob_name = f"{self.gcs_path}/{self.name_prefix}_{uuid.uuid4()}.jsonl"
+        self._uploads.append(self._executor.submit(self._upload_shard, local_path, blob_name, keys))
+
+    def _upload_shard(self, local_path: str, blob_name: str, keys: list) -> str:
+        logger.info(f"Uploading {len(keys)} documents to gs://{self.bucket_name}/{blob_name}")
+        try:
+            gcs_uri = storage_io.upload_file(self.bucket_name, local_path, blob_name)
+        finally:
+            os.remove(local_path)
+        if self.on_shard_uploaded is not None:
+            self.on_shard_uploaded(gcs_uri, keys)
+        return gcs_uri
+
+    def close(self) -> list[str]:
+        """
+        Uploads the last partial shard and waits for all uploads to finish.
+
+        Returns:
+            The GCS URIs of all shards written by this sink.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._roll_over()
+            uploads = list(self._uploads)
+        gcs_uris = [future.result() for future in uploads]
+        self._executor.shutdown()
+        return gcs_uris
@@ -0,0 +1,162 @@
+import re
+import json
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from google.genai.types import EmbedContentConfig
+
+# Internal modules
+import config
+import result_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+# Texts per request accepted by Vertex AI embedding models, by model name
+# prefix; models not listed accept up to DEFAULT_MAX_BATCH_SIZE.
+MODEL_MAX_BATCH_SIZES = {
+    "gemini-embedding-001": 1,
+}
+DEFAULT_MAX_BATCH_SIZE = 250
+
+class GeminiEmbedder:
+    """
+    Embeds texts with a Vertex AI embedding model, through the embedding
+    request scheduler so embedding calls get rate limiting and retries
+    without competing with analysis calls.
+    """
+
+    def __init__(self, model: str, dimensions: int, task_type: str = "RETRIEVAL_DOCUMENT"):
+        self.model = model
+        self.dimensions = dimensions
+        self.task_type = task_type
+        self.name = f"gemini:{model}:{dimensions}"
+        self.max_batch_size = next(
+            (size for prefix, size in MODEL_MAX_BATCH_SIZES.items() if model.startswith(prefix)),
+            DEFAULT_MAX_BATCH_SIZE,
+        )
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        # Imported here so the hashing embedder works without Vertex AI access.
+        import gemini_analyzer
+
+        response = gemini_analyzer.embedding_scheduler.call(
+            self.model,
+            gemini_analyzer.client.models.embed_content,
+            model=self.model,
+            contents=texts,
+            config=EmbedContentConfig(
+                task_type=self.task_type,
+                output_dimensionality=self.dimensions,
+            ),
+        )
+        return _normalize(np.array([embedding.values for embedding in response.embeddings], dtype=np.float32))
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder using feature hashing. It needs no
+    model or network access, so search can be tested end to end locally; the
+    search app has an identical implementation for queries.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.name = f"hashing:{dimensions}"
+        self.max_batch_size = None
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        return _normalize(vectors)
+
+def create_embedder():
+    """Returns the embedder selected by EMBEDDING_PROVIDER."""
+    if config.EMBEDDING_PROVIDER == "hashing":
+        return HashingEmbedder(config.EMBEDDING_DIMENSIONS)
+    if config.EMBEDDING_PROVIDER == "gemini":
+        return GeminiEmbedder(config.EMBEDDING_MODEL_NAME, config.EMBEDDING_DIMENSIONS)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {config.EMBEDDING_PROVIDER}")
+
+_cache = None
+_cache_opened = False
+_cache_lock = threading.Lock()
+
+def get_cache() -> result_cache.ResultCache:
+    """
+    Returns the embedding cache, opened on first use, or None if it is
+    disabled or could not be opened.
+    """
+    global _cache, _cache_opened
+    with _cache_lock:
+        if config.EMBEDDING_CACHE_ENABLED and not _cache_opened:
+            _cache_opened = True
+            try:
+                _cache = result_cache.ResultCache(
+                    config.EMBEDDING_CACHE_PATH,
+                    max_bytes=config.EMBEDDING_CACHE_MAX_BYTES,
+                    gcs_uri=config.EMBEDDING_CACHE_GCS_URI or None,
+                )
+            except Exception as e:
+                logger.error(f"Error opening embedding cache, continuing without it: {e}")
+        return _cache
+
+def text_key(embedder_name: str, text: str) -> str:
+    return hashlib.sha256(json.dumps([embedder_name, text]).encode("utf-8")).hexdigest()
+
+def embed_texts(
+    embedder,
+    texts: list[str],
+    batch_size: int = config.EMBEDDING_BATCH_SIZE,
+    concurrency: int = config.EMBEDDING_CONCURRENCY,
+) -> np.ndarray:
+    """
+    Embeds texts with as few requests as possible: identical texts are
+    embedded once, cached vectors are reused, and the remaining distinct
+    texts are sent in batches of up to `batch_size` (or fewer, if the model
+    accepts fewer texts per request), `concurrency` requests at a time.
+
+    Returns:
+        A float32 array of L2-normalized vectors, one row per text.
+    """
+    if embedder.max_batch_size is not None:
+        batch_size = min(batch_size, embedder.max_batch_size)
+    batch_size = max(1, batch_size)
+
+    vectors = np.zeros((len(texts), embedder.dimensions), dtype=np.float32)
+    rows_by_text = {}
+    for row, text in enumerate(texts):
+        rows_by_text.setdefault(text, []).append(row)
+
+    cache = get_cache()
+    missing = []
+    for text, rows in rows_by_text.items():
+        cached = cache.get(text_key(embedder.name, text)) if cache is not None else None
+        if cached is None:
+            missing.append(text)
+        else:
+            vectors[rows] = np.frombuffer(base64.b64decode(cached), dtype=np.float32)
+
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches) or 1))) as executor:
+        for batch, batch_vectors in zip(batches, executor.map(embedder.embed, batches)):
+            for text, vector in zip(batch, batch_vectors):
+                vectors[rows_by_text[text]] = vector
+                if cache is not None:
+                    cache.put(text_key(embedder.name, text), base64.b64encode(vector.tobytes()).decode("ascii"))
+
+    logger.info(
+        f"Embedded {len(texts)} texts ({len(rows_by_text)} distinct, "
+        f"{len(rows_by_text) - len(missing)} cached) in {len(batches)} requests with {embedder.name}"
+    )
+    return vectors
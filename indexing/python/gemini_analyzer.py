@@ -1,104 +1,249 @@
 import logging
 import json
 import time
+from typing import Optional
 from google import genai
-from google.genai.types import Part, GenerateContentConfig
+from google.genai.types import (
+    FileData,
+    GenerateContentConfig,
+    MediaResolution,
+    Part,
+    VideoMetadata,
+)
 
 # Internal modules
 import config
+import request_scheduler
+import result_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
     client = genai.Client(project=config.PROJECT_ID, location=config.REGION, vertexai=True)
+    scheduler = request_scheduler.RequestScheduler(
+        client,
+        requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE,
+        max_retries=config.GEMINI_MAX_RETRIES,
+        backoff_base=config.GEMINI_BACKOFF_BASE_SECONDS,
+        backoff_max=config.GEMINI_BACKOFF_MAX_SECONDS,
+        initial_concurrency=config.ANALYSIS_CONCURRENCY,
+        max_concurrency=config.GEMINI_MAX_CONCURRENCY,
+    )
+    # Embedding requests are small and have their own quota, so they get a
+    # separate rate limit and concurrency window from analysis requests.
+    embedding_scheduler = request_scheduler.RequestScheduler(
+        client,
+        requests_per_minute=config.EMBEDDING_REQUESTS_PER_MINUTE,
+        max_retries=config.GEMINI_MAX_RETRIES,
+        backoff_base=config.GEMINI_BACKOFF_BASE_SECONDS,
+        backoff_max=config.GEMINI_BACKOFF_MAX_SECONDS,
+        initial_concurrency=config.EMBEDDING_CONCURRENCY,
+        max_concurrency=config.EMBEDDING_CONCURRENCY,
+    )
     logger.info("Vertex AI initialized successfully.")
 except Exception as e:
     logger.error(f"Error initializing Vertex AI: {e}")
 
-def get_video_type(gcs_uri: str) -> str:
-    """
-    Determines the type of video ("sports" or "soap_opera").
-    """
-    logger.info(f"Determining video type for: {gcs_uri}...")
-    prompt = """
-    Analyze the video and determine if it is a "sports" or "soap_opera" video.
-    Respond with a single word: "sports" or "soap_opera".
-    """
+cache = None
+if config.RESULT_CACHE_ENABLED:
     try:
-        video_part = Part.from_uri(file_uri=gcs_uri, mime_type="video/mp4")
-        response = client.models.generate_content(
-            model=config.GEMINI_MODEL_NAME,
-            contents=[prompt, video_part],
+        cache = result_cache.ResultCache(
+            config.RESULT_CACHE_PATH,
+            max_bytes=config.RESULT_CACHE_MAX_BYTES,
+            gcs_uri=config.RESULT_CACHE_GCS_URI or None,
         )
-        video_type = response.text.strip().lower() if response.text else "unknown"
-        logger.info(f"Video type for {gcs_uri} is: {video_type}")
-        return video_type
     except Exception as e:
-        logger.error(f"Failed to determine video type for {gcs_uri}. Error: {e}")
-        return "unknown"
+        logger.error(f"Error opening result cache, continuing without it: {e}")
+
+def _cache_key(
+    prompt: str,
+    gcs_uris: list[str],
+    response_mime_type: Optional[str],
+    options: Optional[dict] = None,
+) -> Optional[str]:
+    if cache is None:
+        return None
+    content_identity = ",".join(cache.content_identity(gcs_uri) for gcs_uri in gcs_uris)
+    if options:
+        # Options that change what the model sees or returns; left out when
+        # unset so existing keys stay valid.
+        content_identity += "|" + json.dumps(options, sort_keys=True)
+    return cache.make_key(config.GEMINI_MODEL_NAME, prompt, content_identity, response_mime_type)
+
+def cached_response(prompt: str, gcs_uris: list[str], response_mime_type: Optional[str] = None) -> Optional[str]:
+    """Returns the cached response text for a request, if any."""
+    cache_key = _cache_key(prompt, gcs_uris, response_mime_type)
+    return cache.get(cache_key) if cache_key is not None else None
 
-def generate_global_context(gcs_uri: str, video_type: str) -> dict:
+def cache_response(prompt: str, gcs_uris: list[str], response_mime_type: Optional[str], text: str):
+    """Caches a response obtained outside `_generate`, e.g. from a batch prediction job."""
+    cache_key = _cache_key(prompt, gcs_uris, response_mime_type)
+    if cache_key is not None and text:
+        cache.put(cache_key, text)
+
+def _generate(
+    prompt: str,
+    gcs_uris: list[str],
+    parse,
+    response_mime_type: Optional[str] = None,
+    response_schema: Optional[dict] = None,
+    low_resolution: bool = False,
+    fps: Optional[float] = None,
+):
     """
-    Performs a preliminary analysis of the entire video to extract global context.
+    Runs a prompt over one or more videos and returns `parse(response_text)`.
+    With several videos, each is preceded by a "Clip N" label.
+    `low_resolution` and `fps` reduce the tokens the model spends per frame
+    and the number of frames it samples.
+
+    Responses are served from the result cache when the same model, prompt and
+    video content were seen before; only responses that parse are cached.
     """
-    logger.info(f"Generating global context for video: {gcs_uri}...")
+    options = {
+        name: value
+        for name, value in (("schema", response_schema), ("low_resolution", low_resolution), ("fps", fps))
+        if value
+    }
+    cache_key = _cache_key(prompt, gcs_uris, response_mime_type, options)
+    if cache_key is not None:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return parse(cached_text)
 
-    if video_type == "sports":
-        prompt = """
-        <INSTRUCTIONS>
-        Analyze this entire sports video to identify the two playing teams and their player rosters.
-        Respond in a structured JSON format with a single field: "teams".
-        - "teams": A list of two JSON objects, each representing a team. Each team object should have the following fields:
-            - "name": The full name of the team.
-            - "short_name": The abbreviated name of the team (e.g., "PBY" for "Persebaya Surabaya").
-            - "jersey_color": The primary color of the team's jersey.
-            - "players": A list of JSON objects, each representing a player on the team. Each player object should have:
-                - "name": The name of the player.
-                - "jersey_number": The player's jersey number.
-        </INSTRUCTIONS>
-        """
-    elif video_type == "soap_opera":
-        prompt = """
-        <INSTRUCTIONS>
-        You are an expert video content analyzer specializing in Indonesian soap operas.
-        Analyze this entire video to identify all characters.
-        Respond in a structured JSON format with a single field: "characters".
-        - "characters": A list of JSON objects, each representing a character. Each character object should have the following fields:
-            - "name": The name of the character.
-            - "role": The role or relationship of the character in the story.
-        </INSTRUCTIONS>
-        """
-    else:
-        return {}
+    video_parts = []
+    for number, gcs_uri in enumerate(gcs_uris, start=1):
+        if len(gcs_uris) > 1:
+            video_parts.append(f"Clip {number}:")
+        if fps:
+            video_parts.append(Part(
+                file_data=FileData(file_uri=gcs_uri, mime_type="video/mp4"),
+                video_metadata=VideoMetadata(fps=fps),
+            ))
+        else:
+            video_parts.append(Part.from_uri(file_uri=gcs_uri, mime_type="video/mp4"))
+    media_resolution = MediaResolution.MEDIA_RESOLUTION_LOW if low_resolution else None
 
+    response = scheduler.generate_content(
+        model=config.GEMINI_MODEL_NAME,
+        contents=[prompt] + video_parts,
+        config=GenerateContentConfig(
+            response_mime_type=response_mime_type,
+            response_schema=response_schema,
+            media_resolution=media_resolution,
+        ),
+    )
+    text = response.text or ""
+    result = parse(text)
+    if cache_key is not None and text:
+        cache.put(cache_key, text)
+    return result
+
+def _parse_json(text: str):
+    cleaned_response = text.strip().replace("```json", "").replace("```", "")
+    return json.loads(cleaned_response)
+
+def parse_analysis(text: str) -> dict:
+    """Parses the response to a segment analysis prompt."""
+    analysis_data = _parse_json(text)
+    # The model sometimes returns a list of objects, so we take the first one
+    if isinstance(analysis_data, list):
+        analysis_data = analysis_data[0] if analysis_data else {}
+    return analysis_data
+
+_STRING = {"type": "STRING"}
+
+VIDEO_CONTEXT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "video_type": {"type": "STRING", "enum": ["sports", "soap_opera", "unknown"]},
+        "teams": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": _STRING,
+                    "short_name": _STRING,
+                    "jersey_color": _STRING,
+                    "players": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {"name": _STRING, "jersey_number": _STRING},
+                        },
+                    },
+                },
+            },
+        },
+        "characters": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"name": _STRING, "role": _STRING},
+            },
+        },
+    },
+    "required": ["video_type"],
+}
+
+def generate_video_context(
+    gcs_uris: list[str],
+    low_resolution: bool = False,
+    fps: Optional[float] = None,
+) -> tuple[str, dict]:
+    """
+    Determines the video type and its global context in a single request.
+
+    `gcs_uris` is either the full video or a sample of its segments.
+    `low_resolution` and `fps` make the model ingest fewer tokens for long
+    videos.
+
+    Returns:
+        The video type ("sports", "soap_opera" or "unknown") and the global
+        context: {"teams": [...]} for sports, {"characters": [...]} for soap
+        operas, {} otherwise.
+    """
+    logger.info(f"Generating video type and global context from {len(gcs_uris)} video(s): {gcs_uris[0]}...")
+    source = "this entire video" if len(gcs_uris) == 1 else f"these {len(gcs_uris)} clips sampled from one video"
+    prompt = f"""
+    <INSTRUCTIONS>
+    Analyze {source}.
+    First determine whether it is a "sports" or a "soap_opera" video, and set "video_type" accordingly ("unknown" if it is neither).
+    - For a sports video, identify the two playing teams and their player rosters in "teams": for each team its full "name", its abbreviated "short_name" (e.g., "PBY" for "Persebaya Surabaya"), the primary "jersey_color" of its jersey, and its "players", each with a "name" and a "jersey_number".
+    - For a soap opera, which are usually Indonesian, identify all characters in "characters": for each its "name" and its "role" or relationship in the story.
+    Leave out the field that does not apply.
+    </INSTRUCTIONS>
+    """
     try:
         start = time.time()
-        video_part = Part.from_uri(file_uri=gcs_uri, mime_type="video/mp4")
-        response = client.models.generate_content(
-            model=config.GEMINI_MODEL_NAME,
-            contents=[prompt, video_part],
-            config=GenerateContentConfig(
-                response_mime_type="application/json"
-            ),
+        context_data = _generate(
+            prompt,
+            gcs_uris,
+            _parse_json,
+            response_mime_type="application/json",
+            response_schema=VIDEO_CONTEXT_SCHEMA,
+            low_resolution=low_resolution,
+            fps=fps,
         )
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "") if response.text else ""
-        context_data = json.loads(cleaned_response)
-        dur = time.time() - start
-        logger.info(f"Generated global context for {gcs_uri}: {context_data} in {dur}s")
-        return context_data
+        video_type = context_data.get("video_type") or "unknown"
+        if video_type == "sports":
+            global_context = {"teams": context_data.get("teams", [])}
+        elif video_type == "soap_opera":
+            global_context = {"characters": context_data.get("characters", [])}
+        else:
+            video_type, global_context = "unknown", {}
+        logger.info(f"Video type {video_type}, global context {global_context} in {time.time() - start}s")
+        return video_type, global_context
 
     except (Exception, json.JSONDecodeError) as e:
-        logger.error(f"Failed to generate global context for {gcs_uri}. Error: {e}")
-        return {}
+        logger.error(f"Failed to generate video type and global context for {gcs_uris[0]}. Error: {e}")
+        return "unknown", {}
 
-def generate_video_analysis(gcs_uri: str, global_context: dict, video_type: str) -> dict:
+def build_analysis_prompt(global_context: dict, video_type: str) -> Optional[str]:
     """
-    Analyzes a video segment using Gemini and generates a structured JSON object.
+    Returns the prompt for analyzing a segment, or None for unsupported
+    video types.
     """
-    logger.info(f"Analyzing video: {gcs_uri} with model {config.GEMINI_MODEL_NAME}...")
-    start = time.time()
-
     context_prompt = ""
     if global_context:
         if video_type == "sports":
@@ -165,27 +310,23 @@ def generate_video_analysis(gcs_uri: str, global_context: dict, video_type: str)
         </CONTEXT>
         """
     else:
+        return None
+    return prompt
+
+def generate_video_analysis(gcs_uri: str, global_context: dict, video_type: str) -> dict:
+    """
+    Analyzes a video segment using Gemini and generates a structured JSON object.
+    """
+    logger.info(f"Analyzing video: {gcs_uri} with model {config.GEMINI_MODEL_NAME}...")
+    start = time.time()
+
+    prompt = build_analysis_prompt(global_context, video_type)
+    if prompt is None:
         return {}
 
     try:
-        video_part = Part.from_uri(file_uri=gcs_uri, mime_type="video/mp4")
-        response = client.models.generate_content(
-            model=config.GEMINI_MODEL_NAME,
-            contents=[prompt, video_part],
-            config=GenerateContentConfig(
-                response_mime_type="application/json"
-            )
-        )
+        analysis_data = _generate(prompt, [gcs_uri], parse_analysis, response_mime_type="application/json")
 
-        # Clean the response and load as JSON
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "") if response.text else ""
-        analysis_data = json.loads(cleaned_response)
-
-        # The model sometimes returns a list of objects, so we take the first one
-        if isinstance(analysis_data, list):
-            if analysis_data:
-                analysis_data = analysis_data[0]
-        
         dur = time.time() - start
         logger.info(f"Generated analysis for {gcs_uri}: {analysis_data} in {dur}s")
         return analysis_data
@@ -193,3 +334,97 @@ def generate_video_analysis(gcs_uri: str, global_context: dict, video_type: str)
     except (Exception, json.JSONDecodeError) as e:
         logger.error(f"Failed to generate or parse analysis for {gcs_uri}. Error: {e}")
         return {}
+
+BATCH_INSTRUCTIONS = """
+        <BATCH>
+        The videos below are {count} clips from the same video, each preceded by its label ("Clip 1" to "Clip {count}").
+        Analyze each clip on its own, following the instructions above, and respond with a single JSON array with one object per clip, in clip order.
+        Each object must have a "clip" field with the number of its clip in addition to the fields of the output format.
+        </BATCH>
+        """
+
+def _is_valid_analysis(analysis_data) -> bool:
+    return (
+        isinstance(analysis_data, dict)
+        and isinstance(analysis_data.get("description"), str)
+        and bool(analysis_data["description"].strip())
+        and all(isinstance(analysis_data.get(field, []), list) for field in ("persons", "organizations", "hash_tags"))
+    )
+
+def split_batch_response(response_data, count: int) -> list[dict]:
+    """
+    Splits the JSON array answering a batched analysis request into one
+    analysis per clip. Entries are matched to clips by their "clip" number,
+    or by position when the model omitted the numbers but returned exactly
+    one entry per clip.
+
+    Returns:
+        `count` analyses in clip order; an empty dict for each clip that is
+        missing, duplicated or invalid in the response.
+    """
+    if isinstance(response_data, dict):
+        # Tolerate the array being wrapped in an object, e.g. {"clips": [...]}.
+        response_data = next((value for value in response_data.values() if isinstance(value, list)), [])
+    if not isinstance(response_data, list):
+        return [{} for _ in range(count)]
+
+    numbered = all(isinstance(entry, dict) and isinstance(entry.get("clip"), int) for entry in response_data)
+    if not numbered and len(response_data) != count:
+        return [{} for _ in range(count)]
+
+    analyses = [{} for _ in range(count)]
+    seen = set()
+    for position, entry in enumerate(response_data):
+        clip = entry["clip"] - 1 if numbered else position
+        if not 0 <= clip < count:
+            logger.warning(f"Discarding batched analysis for unknown clip {clip + 1}")
+            continue
+        if clip in seen:
+            # Two answers for one clip: trust neither.
+            logger.warning(f"Discarding repeated batched analyses for clip {clip + 1}")
+            analyses[clip] = {}
+            continue
+        seen.add(clip)
+        if _is_valid_analysis(entry):
+            analyses[clip] = {key: value for key, value in entry.items() if key != "clip"}
+    return analyses
+
+def generate_batch_analysis(gcs_uris: list[str], global_context: dict, video_type: str) -> list[dict]:
+    """
+    Analyzes several segments of a video with a single Gemini request, so the
+    instructions and global context are sent once instead of once per
+    segment. Segments missing or invalid in the batched response are
+    analyzed again on their own.
+
+    Returns:
+        One analysis dict per segment, in the order of `gcs_uris`, each as
+        returned by `generate_video_analysis`.
+    """
+    if len(gcs_uris) == 1:
+        return [generate_video_analysis(gcs_uris[0], global_context, video_type)]
+
+    logger.info(f"Analyzing {len(gcs_uris)} segments in one request with model {config.GEMINI_MODEL_NAME}...")
+    start = time.time()
+
+    prompt = build_analysis_prompt(global_context, video_type)
+    if prompt is None:
+        return [{} for _ in gcs_uris]
+    prompt += BATCH_INSTRUCTIONS.format(count=len(gcs_uris))
+
+    try:
+        analyses = _generate(
+            prompt,
+            gcs_uris,
+            lambda text: split_batch_response(_parse_json(text), len(gcs_uris)),
+            response_mime_type="application/json",
+        )
+    except (Exception, json.JSONDecodeError) as e:
+        logger.error(f"Failed to generate or parse batched analysis for {len(gcs_uris)} segments. Error: {e}")
+        analyses = [{} for _ in gcs_uris]
+
+    dur = time.time() - start
+    missing = [i for i, analysis_data in enumerate(analyses) if not analysis_data]
+    logger.info(f"Generated batched analysis for {len(gcs_uris) - len(missing)} of {len(gcs_uris)} segments in {dur}s")
+    for i in missing:
+        analyses[i] = generate_video_analysis(gcs_uris[i], global_context, video_type)
+    return analyses
@@ -1,10 +1,14 @@
 import os
+import sys
 import json
-import uuid
+import time
 import argparse
-import tempfile
+import traceback
+import statistics
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from google.cloud import storage
 from datetime import datetime, timezone
 
 # Import our pipeline modules
@@ -12,103 +16,797 @@ import config
 import video_processor
 import gemini_analyzer
 import discovery_engine_indexer
+import run_manifest
+import storage_io
+import document_sink
+import embedder
+import vector_index
+import batch_prediction
 
-def run_pipeline(gcs_video_uri: str):
+# Source files picked up by batch mode.
+VIDEO_EXTENSIONS = (".mp4",)
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def analyze_segments(
+    segments: Iterable[tuple[int, str]],
+    resolve_context: Callable[[], tuple[str, dict]],
+    concurrency: int,
+    on_result: Optional[Callable[[int, dict], None]] = None,
+    batch_size: int = config.ANALYSIS_BATCH_SIZE,
+) -> dict[int, dict]:
     """
-    Orchestrates the indexing pipeline for a single video, creating documents
-    that conform to the specific data store schema.
+    Analyzes `(index, gcs_uri)` segments with up to `concurrency` Gemini
+    requests in flight, each covering up to `batch_size` segments. Segments
+    are submitted as the iterable produces them, so it may be a stream that
+    is still being split and uploaded.
+
+    `resolve_context()` returns the video type and global context and may
+    block until they are ready. `on_result(index, analysis)` is called from
+    the worker thread as each segment finishes.
+
+    Returns:
+        A dict mapping each segment index to its analysis dict.
     """
-    print(f"--- Starting Pipeline for: {gcs_video_uri} ---")
+    analyses = {}
+    latencies = []
+    lock = threading.Lock()
+    progress = tqdm(desc="Analyzing segments", unit="segment")
+
+    def analyze(batch: list[tuple[int, str]]):
+        video_type, global_context = resolve_context()
+        start = time.time()
+        batch_analyses = gemini_analyzer.generate_batch_analysis(
+            [seg_uri for _, seg_uri in batch], global_context, video_type
+        )
+        latency = time.time() - start
+        with lock:
+            for (index, _), analysis_data in zip(batch, batch_analyses):
+                analyses[index] = analysis_data
+            latencies.append(latency)
+        progress.update(len(batch))
+        if on_result is not None:
+            for (index, _), analysis_data in zip(batch, batch_analyses):
+                on_result(index, analysis_data)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(analyze, batch) for batch in _batches(segments, max(1, batch_size))]
+        for future in futures:
+            future.result()
+    progress.close()
+    elapsed = time.time() - start
+
+    if latencies:
+        print(
+            f"Analyzed {len(analyses)} segments in {len(latencies)} requests in {elapsed:.1f}s "
+            f"with concurrency {concurrency}: "
+            f"{len(analyses) / elapsed:.2f} segments/s, "
+            f"request latency p50 {statistics.median(latencies):.1f}s, "
+            f"mean {statistics.mean(latencies):.1f}s, max {max(latencies):.1f}s"
+        )
+    return analyses
+
+class BulkAnalysis:
+    """
+    Stands in for `analyze_segments` in bulk mode: segments are collected
+    from any number of videos instead of analyzed, then `run` analyzes them
+    all with a single batch prediction job and reports each result through
+    the `on_result` callback of its video.
+    """
+
+    def __init__(self, runner, job_uri: str):
+        self.runner = runner
+        self.job_uri = job_uri
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def collect(
+        self,
+        segments: Iterable[tuple[int, str]],
+        resolve_context: Callable[[], tuple[str, dict]],
+        on_result: Callable[[int, dict], None],
+    ):
+        video_type, global_context = resolve_context()
+        prompt = gemini_analyzer.build_analysis_prompt(global_context, video_type)
+        if prompt is None:
+            # Unsupported video type: drain the segments (which may still be
+            # splitting) and leave them pending, as a failed analysis would.
+            for _ in segments:
+                pass
+            return
+        # `segments` may be a generator that is still splitting the video, so
+        # it is drained before taking the lock shared by every video.
+        requests = [
+            (batch_prediction.BatchRequest(prompt, seg_uri, "application/json"), index, on_result)
+            for index, seg_uri in segments
+        ]
+        with self._lock:
+            self._pending.extend(requests)
+
+    @staticmethod
+    def _deliver(request: batch_prediction.BatchRequest, index: int, on_result: Callable[[int, dict], None], text: str) -> bool:
+        try:
+            analysis_data = gemini_analyzer.parse_analysis(text)
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse batch prediction output for {request.gcs_uri}: {e}")
+            return False
+        gemini_analyzer.cache_response(request.prompt, [request.gcs_uri], request.response_mime_type, text)
+        on_result(index, analysis_data)
+        return True
+
+    def run(self) -> int:
+        """
+        Analyzes all collected segments. Cached responses are delivered
+        first; if the batch prediction job fails, the remaining segments are
+        left pending in their manifests for a resumed run.
+
+        Returns:
+            The number of segments left pending.
+        """
+        pending, self._pending = self._pending, []
+        delivered = 0
+        uncached = []
+        for request, index, on_result in pending:
+            text = gemini_analyzer.cached_response(request.prompt, [request.gcs_uri], request.response_mime_type)
+            if text is None:
+                uncached.append((request, index, on_result))
+            else:
+                delivered += self._deliver(request, index, on_result, text)
+        print(f"[Bulk] {len(pending) - len(uncached)} of {len(pending)} segments answered from the result cache.")
+
+        if uncached:
+            print(f"[Bulk] Submitting a batch prediction job for {len(uncached)} segments...")
+            try:
+                responses = batch_prediction.run_job(self.runner, [request for request, _, _ in uncached], self.job_uri)
+            except Exception as e:
+                print(f"[Bulk] Batch prediction job failed, leaving {len(uncached)} segments pending: {e}")
+                responses = []
+            for (request, index, on_result), response in zip(uncached, responses):
+                if response.text is None:
+                    print(f"Batch prediction failed for {request.gcs_uri}: {response.error}")
+                    continue
+                delivered += self._deliver(request, index, on_result, response.text)
+        if gemini_analyzer.cache is not None:
+            gemini_analyzer.cache.sync()
+        return len(pending) - delivered
+
+def _analysis_uri(segment: dict) -> str:
+    # Segments are analyzed from their proxy when there is one; documents
+    # always point at the full-quality segment.
+    return segment.get("analysis_uri") or segment["uri"]
+
+def _sample_segment_uris(segments: list[dict], count: int) -> list[str]:
+    if len(segments) <= count:
+        return [_analysis_uri(segment) for segment in segments]
+    step = len(segments) / count
+    return [_analysis_uri(segments[int(i * step + step / 2)]) for i in range(count)]
+
+def resolve_video_context(
+    gcs_video_uri: str,
+    manifest: run_manifest.RunManifest,
+    source: str = config.VIDEO_CONTEXT_SOURCE,
+) -> tuple[str, dict]:
+    """
+    Determines the video type and global context of the full video in one
+    Gemini request, reusing the values recorded in the run manifest when
+    available. `source` selects what the request covers (see
+    VIDEO_CONTEXT_SOURCE); "segments" requires the segments in the manifest.
+    """
+    print(f"[Steps 2-3/5] Determining video type and global context...")
+    video_type = manifest.get("video_type")
+    global_context = manifest.get("global_context")
+    if video_type not in (None, "unknown") and (global_context or video_type not in ("sports", "soap_opera")):
+        return video_type, global_context or {}
+
+    if source == "segments":
+        video_type, global_context = gemini_analyzer.generate_video_context(
+            _sample_segment_uris(manifest.segments, config.VIDEO_CONTEXT_SAMPLE_SEGMENTS),
+        )
+    elif source == "low_res":
+        video_type, global_context = gemini_analyzer.generate_video_context(
+            [gcs_video_uri], low_resolution=True, fps=config.VIDEO_CONTEXT_FPS,
+        )
+    else:
+        video_type, global_context = gemini_analyzer.generate_video_context([gcs_video_uri])
+    manifest.set("video_type", video_type)
+    manifest.set("global_context", global_context)
+    return video_type, global_context
+
+def _segment_signature(segment: dict) -> Optional[video_processor.SegmentSignature]:
+    signature = segment.get("signature")
+    if signature is None:
+        return None
+    return video_processor.SegmentSignature(tuple(signature["frame_hashes"]), signature["motion"])
+
+def _record_streamed_segments(
+    manifest: run_manifest.RunManifest,
+    stream: Iterable[video_processor.Segment],
+) -> Iterator[tuple[int, str]]:
+    for segment in stream:
+        yield manifest.add_segment(segment), segment.analysis_uri or segment.uri
+    manifest.complete_segmentation()
+
+def index_video(
+    gcs_video_uri: str,
+    sink: document_sink.DocumentSink,
+    concurrency: int = config.ANALYSIS_CONCURRENCY,
+    resume: bool = False,
+    stream: bool = False,
+    source_read_mode: str = config.SOURCE_READ_MODE,
+    bulk: Optional[BulkAnalysis] = None,
+) -> run_manifest.RunManifest:
+    """
+    Splits and analyzes a single video, writing a document that conforms to
+    the specific data store schema to `sink` as soon as each segment's
+    analysis finishes.
+
+    Progress is checkpointed in a run manifest; with `resume`, stages and
+    segments completed by a previous run of the same video are skipped.
+    With `stream`, segments are analyzed as soon as ffmpeg produces them.
+    `source_read_mode` selects whether ffmpeg reads a local download or
+    range-reads the source over HTTP. With `bulk`, segments are handed to it
+    instead of being analyzed, and their documents are written once it runs.
+
+    Returns:
+        The run manifest, whose segments are marked written as the sink
+        uploads their shards.
+    """
+    manifest = run_manifest.RunManifest(
+        gcs_video_uri,
+        local_dir=config.MANIFEST_LOCAL_DIR,
+        gcs_bucket_name=config.GCS_BUCKET if config.MANIFEST_GCS_PATH else None,
+        gcs_path=config.MANIFEST_GCS_PATH,
+        sync_interval=config.MANIFEST_SYNC_INTERVAL,
+    )
+    if resume and manifest.load():
+        print(f"Resuming from run manifest: {manifest.local_path}")
 
     # 1. Process the video into segments
-    print(f"[Step 1/3] Processing video...")
+    print(f"[Step 1/5] Processing video...")
     if not gcs_video_uri.startswith("gs://"):
         raise ValueError("Invalid GCS URI. Must start with 'gs://'")
     bucket_name, *blob_parts = gcs_video_uri[5:].split('/')
     video_blob_path = "/".join(blob_parts)
-    
-    segment_gcs_uris = video_processor.process_video_from_gcs(
-        gcs_bucket_name=bucket_name,
-        gcs_video_path=video_blob_path,
-        segment_duration=15,
-        processed_segments_gcs_path=config.PROCESSED_SEGMENTS_GCS_PATH,
-    )
+    video_basename = os.path.basename(video_blob_path)
+
+    def write_document(index: int):
+        document = build_document(manifest.segments[index], video_basename)
+        if document is not None:
+            sink.write(document, key=(manifest, index))
+
+    # Static segments and duplicates waiting for the analysis they reuse, with
+    # their verdicts, by the index of the analyzed segment. If its analysis
+    # fails they stay pending and are classified again by a resumed run.
+    waiting_duplicates = {}
+    duplicates_lock = threading.Lock()
+    prefilter_counts = {"static": 0, "duplicate": 0}
+
+    def record_analysis(index: int, analysis_data: dict):
+        # Failed analyses are left pending so that a resumed run retries them.
+        if analysis_data:
+            with duplicates_lock:
+                manifest.mark_analyzed(index, analysis_data)
+                duplicates = waiting_duplicates.pop(index, [])
+            write_document(index)
+            for duplicate_index, verdict in duplicates:
+                manifest.mark_reused(duplicate_index, index, verdict)
+                write_document(duplicate_index)
+
+    def prefilter_segments(segments: Iterable[tuple[int, str]]) -> Iterator[tuple[int, str]]:
+        """
+        Yields the segments that need a Gemini call. Every segment is
+        classified, including ones analyzed by a previous run, so static
+        segments and duplicates can reuse their analyses.
+        """
+        prefilter = video_processor.SegmentPrefilter(
+            config.PREFILTER_DUPLICATE_MAX_DISTANCE,
+            config.PREFILTER_STATIC_MAX_MOTION,
+        )
+        for index, seg_uri in segments:
+            segment = manifest.segments[index]
+            # Earlier runs skipped static segments without an analysis.
+            already_analyzed = manifest.has_reached(index, "analyzed") and not (
+                segment["prefilter"] == "static" and segment["analysis"] is None
+            )
+            if not config.SEGMENT_PREFILTER_ENABLED:
+                verdict, source_index = "analyze", None
+            else:
+                verdict, source_index = prefilter.classify(index, _segment_signature(segment))
+            if already_analyzed:
+                continue
+            if verdict in ("static", "duplicate"):
+                prefilter_counts[verdict] += 1
+                with duplicates_lock:
+                    source_ready = manifest.segments[source_index]["analysis"] is not None
+                    if not source_ready:
+                        waiting_duplicates.setdefault(source_index, []).append((index, verdict))
+                if source_ready:
+                    manifest.mark_reused(index, source_index, verdict)
+                    write_document(index)
+                continue
+            yield index, seg_uri
 
     # 2. Analyze segments and prepare the final JSON data
-    print(f"[Step 2/5] Determining video type...")
-    video_type = gemini_analyzer.get_video_type(gcs_video_uri)
+    with ThreadPoolExecutor(max_workers=1) as background:
+        # The full-video stages do not depend on the segments, so they run
+        # while the video is being split and uploaded; a context from sampled
+        # segments has to wait for the split.
+        context_source = config.VIDEO_CONTEXT_SOURCE
+        if context_source == "segments" and stream and not manifest.segmentation_complete:
+            context_source = "low_res"
+        context_future = None
+        if context_source != "segments":
+            context_future = background.submit(resolve_video_context, gcs_video_uri, manifest, context_source)
 
-    print(f"[Step 3/5] Generating global context for the video...")
-    global_context = gemini_analyzer.generate_global_context(gcs_video_uri, video_type)
+        if manifest.segmentation_complete:
+            print(f"Reusing {len(manifest.segments)} segments from the previous run.")
+        elif stream:
+            manifest.reset_segments()
+        else:
+            manifest.set_segments(video_processor.process_video_from_gcs(
+                gcs_bucket_name=bucket_name,
+                gcs_video_path=video_blob_path,
+                segment_duration=15,
+                processed_segments_gcs_path=config.PROCESSED_SEGMENTS_GCS_PATH,
+                source_read_mode=source_read_mode,
+            ))
 
-    print(f"[Step 4/5] Analyzing {len(segment_gcs_uris)} segments with Gemini...")
-    video_documents = []
-    video_basename = os.path.basename(video_blob_path)
-    total_duration_processed = 0
-
-    for i, (seg_uri, duration) in enumerate(tqdm(segment_gcs_uris, desc="Analyzing segments")):
-        analysis_data = gemini_analyzer.generate_video_analysis(seg_uri, global_context, video_type)
-        if analysis_data and analysis_data.get("description"):
-            start_time = total_duration_processed
-            total_duration_processed += duration
-
-            schema_compliant_data = {
-                # --- Required fields ---
-                # Truncate title to 1000 chars to comply with Vertex AI Search's document.title limit.
-                "title": f'{analysis_data.get("description")} {" ".join(analysis_data.get("hash_tags", []))}'[:1000],
-                "categories": ["Sports", "Soccer", "Video Highlight"],
-                "uri": seg_uri,
-                "available_time": datetime.now(timezone.utc).isoformat(),
-
-                # --- Optional but important fields ---
-                "description": f"Segment from {video_basename} at {start_time}s",
-                "duration": f"{duration}s",
-                "in_languages": ["en"],
-                "media_type": "sports-game",
-                "persons": analysis_data.get("persons", []),
-                "organizations": analysis_data.get("organizations", []),
-                "hash_tags": analysis_data.get("hash_tags", []),
-            }
+        if context_future is None:
+            context_future = background.submit(resolve_video_context, gcs_video_uri, manifest, context_source)
 
-            simple_json_data = {
-                "id": str(uuid.uuid4()),
-                "struct_data": schema_compliant_data
-            }
-            video_documents.append(simple_json_data)
+        # Segments analyzed by a previous run whose documents never reached GCS.
+        for i, segment in enumerate(manifest.segments):
+            if segment["state"] == "analyzed":
+                write_document(i)
+
+        if manifest.segmentation_complete:
+            segments = list(prefilter_segments(
+                (i, _analysis_uri(segment)) for i, segment in enumerate(manifest.segments)
+            ))
+            print(f"[Step 4/5] Analyzing {len(segments)} of {len(manifest.segments)} segments with Gemini...")
+        else:
+            segments = prefilter_segments(_record_streamed_segments(manifest, video_processor.stream_video_segments_from_gcs(
+                gcs_bucket_name=bucket_name,
+                gcs_video_path=video_blob_path,
+                segment_duration=15,
+                processed_segments_gcs_path=config.PROCESSED_SEGMENTS_GCS_PATH,
+                source_read_mode=source_read_mode,
+            )))
+            print(f"[Step 4/5] Analyzing segments with Gemini as they are split...")
+
+        if bulk is not None:
+            bulk.collect(segments, context_future.result, record_analysis)
+        else:
+            analyze_segments(segments, context_future.result, concurrency, on_result=record_analysis)
+
+    manifest.save(force=True)
+    if config.SEGMENT_PREFILTER_ENABLED:
+        print(
+            f"Pre-filter: reused analyses for {prefilter_counts['static']} static segments "
+            f"and {prefilter_counts['duplicate']} duplicates."
+        )
+    print(f"Gemini request stats: {gemini_analyzer.scheduler.stats()}")
+    if gemini_analyzer.cache is not None:
+        print(f"Result cache stats: {gemini_analyzer.cache.stats()}")
+        gemini_analyzer.cache.sync()
+
+    return manifest
+
+def _mark_segments_written(jsonl_uri: str, keys: list):
+    # Sink keys are (manifest, segment index) pairs, possibly from several videos.
+    by_manifest = {}
+    for manifest, index in keys:
+        by_manifest.setdefault(id(manifest), (manifest, []))[1].append(index)
+    for manifest, indexes in by_manifest.values():
+        manifest.mark_written(indexes, jsonl_uri)
 
-    # 3. Upload the JSONL file and trigger the import job
-    print(f"[Step 5/5] Uploading {len(video_documents)} documents and triggering import...")
-    if not video_documents:
-        print("No documents were generated for this video. Skipping import.")
+def new_document_sink(name_prefix: str) -> document_sink.DocumentSink:
+    return document_sink.DocumentSink(
+        config.GCS_BUCKET,
+        config.JSONL_GCS_PATH,
+        name_prefix,
+        max_documents=config.JSONL_SHARD_MAX_DOCUMENTS,
+        max_bytes=config.JSONL_SHARD_MAX_BYTES,
+        on_shard_uploaded=_mark_segments_written,
+    )
+
+def build_document(segment: dict, video_basename: str) -> Optional[dict]:
+    """
+    Builds the data store document for an analyzed segment recorded in the
+    run manifest, or returns None if the analysis has no description.
+    """
+    analysis_data = segment["analysis"]
+    if not analysis_data or not analysis_data.get("description"):
+        return None
+
+    schema_compliant_data = {
+        # --- Required fields ---
+        # Truncate title to 1000 chars to comply with Vertex AI Search's document.title limit.
+        "title": f'{analysis_data.get("description")} {" ".join(analysis_data.get("hash_tags", []))}'[:1000],
+        "categories": ["Sports", "Soccer", "Video Highlight"],
+        "uri": segment["uri"],
+        "available_time": datetime.now(timezone.utc).isoformat(),
+
+        # --- Optional but important fields ---
+        "description": f"Segment from {video_basename} at {segment['start_time']}s",
+        "duration": f"{segment['duration']}s",
+        "in_languages": ["en"],
+        "media_type": "sports-game",
+        "persons": analysis_data.get("persons", []),
+        "organizations": analysis_data.get("organizations", []),
+        "hash_tags": analysis_data.get("hash_tags", []),
+    }
+
+    return {
+        "id": segment["document_id"],
+        "struct_data": schema_compliant_data
+    }
+
+def _store_vector_index(records: list[dict], vectors, embedder_name: str, replace: bool = False):
+    index_dir = config.VECTOR_INDEX_LOCAL_DIR
+    # The GCS mirror is the source of truth: a local copy may be stale (e.g.
+    # from an earlier run on this machine), and merging into it would drop
+    # other runs' updates when the result is uploaded.
+    if config.VECTOR_INDEX_GCS_PATH and not replace:
+        vector_index.download_index(config.GCS_BUCKET, config.VECTOR_INDEX_GCS_PATH, index_dir)
+    if replace:
+        vector_index.write_index(index_dir, records, vectors, embedder_name, config.VECTOR_INDEX_IVF_THRESHOLD)
+    else:
+        vector_index.update_index(index_dir, records, vectors, embedder_name, config.VECTOR_INDEX_IVF_THRESHOLD)
+    if config.VECTOR_INDEX_GCS_PATH:
+        vector_index.upload_index(index_dir, config.GCS_BUCKET, config.VECTOR_INDEX_GCS_PATH)
+
+def update_vector_index(manifests: list[run_manifest.RunManifest]):
+    """
+    Embeds the documents of the given videos, stores each JSONL shard's
+    vectors next to it and merges them into the vector index, which is then
+    mirrored to GCS.
+    """
+    records = []
+    jsonl_uris = []
+    for manifest in manifests:
+        video_basename = os.path.basename(manifest.get("video_uri"))
+        for segment in manifest.segments:
+            document = build_document(segment, video_basename)
+            if document is None:
+                continue
+            struct_data = document["struct_data"]
+            records.append({
+                "id": document["id"],
+                "title": struct_data["title"],
+                "snippet": struct_data["description"],
+                "uri": struct_data["uri"],
+            })
+            jsonl_uris.append(segment["jsonl_uri"])
+    if not records:
         return
 
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".jsonl") as tmpfile:
-        for doc in video_documents:
-            tmpfile.write(json.dumps(doc) + '\n')
-        tmpfile_path = tmpfile.name
-    
-    jsonl_filename = f"{video_basename}_{uuid.uuid4()}.jsonl"
-    jsonl_blob_name = f"{config.JSONL_GCS_PATH}/{jsonl_filename}"
-    
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(config.GCS_BUCKET)
-    blob = bucket.blob(jsonl_blob_name)
-    
-    print(f"Uploading data to gs://{config.GCS_BUCKET}/{jsonl_blob_name}")
-    blob.upload_from_filename(tmpfile_path)
-    os.remove(tmpfile_path)
-
-    jsonl_gcs_uri_for_import = f"gs://{config.GCS_BUCKET}/{jsonl_blob_name}"
-    discovery_engine_indexer.import_documents_from_gcs(jsonl_gcs_uri_for_import)
-    
-    print(f"\n--- Successfully submitted pipeline for: {gcs_video_uri} ---")
+    # The title holds the segment description and its hashtags.
+    segment_embedder = embedder.create_embedder()
+    print(f"[Vector index] Embedding {len(records)} documents with {segment_embedder.name}...")
+    vectors = embedder.embed_texts(segment_embedder, [record["title"] for record in records])
+
+    rows_by_shard = {}
+    for row, jsonl_uri in enumerate(jsonl_uris):
+        if jsonl_uri:
+            rows_by_shard.setdefault(jsonl_uri, []).append(row)
+    for jsonl_uri, rows in rows_by_shard.items():
+        vector_index.write_shard_embeddings(jsonl_uri, [records[row]["id"] for row in rows], vectors[rows])
+
+    _store_vector_index(records, vectors, segment_embedder.name)
+    if embedder.get_cache() is not None:
+        embedder.get_cache().sync()
+
+def reembed_vector_index():
+    """
+    Re-embeds every document in the vector index with the current embedder,
+    e.g. after changing EMBEDDING_MODEL_NAME, and rebuilds the index.
+    """
+    index_dir = config.VECTOR_INDEX_LOCAL_DIR
+    if config.VECTOR_INDEX_GCS_PATH:
+        vector_index.download_index(config.GCS_BUCKET, config.VECTOR_INDEX_GCS_PATH, index_dir)
+    records, _, _ = vector_index.read_index(index_dir)
+    if not records:
+        print("No vector index found to re-embed.")
+        return
+
+    segment_embedder = embedder.create_embedder()
+    print(f"[Vector index] Re-embedding {len(records)} documents with {segment_embedder.name}...")
+    vectors = embedder.embed_texts(segment_embedder, [record["title"] for record in records])
+    _store_vector_index(records, vectors, segment_embedder.name, replace=True)
+    if embedder.get_cache() is not None:
+        embedder.get_cache().sync()
+
+def _try_update_vector_index(manifests: list[run_manifest.RunManifest]) -> bool:
+    """
+    Updates the vector index. It is an optional fast path, so a failure must
+    not prevent the Discovery Engine import, but it fails the run.
+
+    Returns:
+        False if the update failed.
+    """
+    if not config.VECTOR_INDEX_ENABLED:
+        return True
+    try:
+        update_vector_index(manifests)
+        return True
+    except Exception:
+        print("ERROR: Failed to update the vector index; it does not include the documents of this run.")
+        traceback.print_exc()
+        return False
+
+def wait_for_import(jsonl_gcs_uris: list[str]) -> discovery_engine_indexer.ImportResult:
+    """
+    Imports JSONL shards and waits for the import operations to finish.
+    """
+    import_future = discovery_engine_indexer.import_documents(jsonl_gcs_uris)
+    print(f"Waiting for the import of {len(jsonl_gcs_uris)} JSONL files to complete...")
+    result = import_future.result()
+    print(
+        f"Import completed in {result.latency:.1f}s: "
+        f"{result.success_count} documents imported, {result.failure_count} failed."
+    )
+    return result
+
+def mark_imported(
+    manifest: run_manifest.RunManifest,
+    indexes: list[int],
+    result: discovery_engine_indexer.ImportResult,
+) -> int:
+    """
+    Marks the segments whose JSONL shard was imported without failures as
+    imported. The others stay written, so `--resume` imports them again.
+
+    Returns:
+        The number of segments left written.
+    """
+    succeeded = set(result.succeeded_uris)
+    imported = [i for i in indexes if manifest.segments[i]["jsonl_uri"] in succeeded]
+    manifest.set_state(imported, "imported")
+    return len(indexes) - len(imported)
+
+def run_pipeline(
+    gcs_video_uri: str,
+    concurrency: int = config.ANALYSIS_CONCURRENCY,
+    resume: bool = False,
+    stream: bool = False,
+    source_read_mode: str = config.SOURCE_READ_MODE,
+) -> bool:
+    """
+    Orchestrates the indexing pipeline for a single video: indexes it with
+    `index_video`, streaming its documents to GCS, then triggers the import.
+
+    Returns:
+        False if some documents failed to import or the vector index update
+        failed.
+    """
+    print(f"--- Starting Pipeline for: {gcs_video_uri} ---")
+    gemini_analyzer.scheduler.set_concurrency(concurrency, concurrency)
+    sink = new_document_sink(os.path.basename(gcs_video_uri))
+    try:
+        manifest = index_video(
+            gcs_video_uri,
+            sink,
+            concurrency=concurrency,
+            resume=resume,
+            stream=stream,
+            source_read_mode=source_read_mode,
+        )
+    finally:
+        # Upload whatever was written, even if indexing failed part-way.
+        sink.close()
+
+    vector_index_updated = _try_update_vector_index([manifest])
+
+    # 3. Trigger the import job for the uploaded JSONL files
+    document_indexes, jsonl_gcs_uris = manifest.pending_imports()
+    print(f"[Step 5/5] Importing {len(document_indexes)} documents from {len(jsonl_gcs_uris)} JSONL files...")
+    if not document_indexes:
+        print("No new documents were generated for this video. Skipping import.")
+        return vector_index_updated
+
+    result = wait_for_import(jsonl_gcs_uris)
+    not_imported = mark_imported(manifest, document_indexes, result)
+    if not_imported:
+        print(f"\n--- Import incomplete for {gcs_video_uri}: {not_imported} documents not imported; rerun with --resume ---")
+        return False
+
+    if not vector_index_updated:
+        print(f"\n--- Completed pipeline for: {gcs_video_uri}, but the vector index update failed ---")
+        return False
+    print(f"\n--- Successfully completed pipeline for: {gcs_video_uri} ---")
+    return True
+
+def list_videos(gcs_prefix_uri: str) -> list[str]:
+    """
+    Lists the videos under a GCS prefix (e.g., gs://my-bucket/videos/).
+
+    Returns:
+        The GCS URIs of the videos, sorted by name.
+    """
+    if not gcs_prefix_uri.startswith("gs://"):
+        raise ValueError("Invalid GCS URI. Must start with 'gs://'")
+    bucket_name, _, prefix = gcs_prefix_uri[5:].partition('/')
+    blobs = storage_io.get_client().list_blobs(bucket_name, prefix=prefix)
+    return sorted(
+        f"gs://{bucket_name}/{blob.name}"
+        for blob in blobs
+        if blob.name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+def run_batch(
+    gcs_prefix_uri: str,
+    video_workers: int = config.BATCH_VIDEO_WORKERS,
+    concurrency: int = config.ANALYSIS_CONCURRENCY,
+    resume: bool = False,
+    stream: bool = False,
+    source_read_mode: str = config.SOURCE_READ_MODE,
+    bulk: bool = False,
+) -> bool:
+    """
+    Indexes every video under a GCS prefix with up to `video_workers` videos
+    in progress at once, streaming all documents into shared JSONL shards,
+    then imports them together in as few import operations as possible.
+
+    ffmpeg splits are limited by SPLIT_CONCURRENCY and Gemini calls by the
+    shared request scheduler, so adding video workers overlaps the stages of
+    different videos without oversubscribing either.
+
+    With `bulk`, the segments of all videos are analyzed by one batch
+    prediction job once every video is split, instead of interactively.
+
+    Returns:
+        False if some segments were not analyzed in bulk, some documents
+        failed to import or the vector index update failed.
+    """
+    video_uris = list_videos(gcs_prefix_uri)
+    print(f"--- Starting batch pipeline for {len(video_uris)} videos under: {gcs_prefix_uri} ---")
+    if not video_uris:
+        return True
+    # `concurrency` is per video; the shared window may grow to cover every
+    # video worker.
+    gemini_analyzer.scheduler.set_concurrency(concurrency, concurrency * max(1, min(video_workers, len(video_uris))))
+
+    batch_name = f"batch_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+    sink = new_document_sink(batch_name)
+    bulk_analysis = None
+    if bulk:
+        bulk_analysis = BulkAnalysis(
+            batch_prediction.create_runner(),
+            f"{config.BATCH_PREDICTION_URI.rstrip('/')}/{batch_name}",
+        )
+    indexed = []
+    failed = []
+    not_analyzed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, video_workers)) as executor:
+            futures = {
+                executor.submit(
+                    index_video,
+                    video_uri,
+                    sink,
+                    concurrency=concurrency,
+                    resume=resume,
+                    stream=stream,
+                    source_read_mode=source_read_mode,
+                    bulk=bulk_analysis,
+                ): video_uri
+                for video_uri in video_uris
+            }
+            for future in as_completed(futures):
+                video_uri = futures[future]
+                try:
+                    indexed.append(future.result())
+                except Exception as e:
+                    print(f"Failed to index {video_uri}: {e}")
+                    failed.append(video_uri)
+                    continue
+                print(f"Indexed {video_uri}.")
+        if bulk_analysis is not None:
+            not_analyzed = bulk_analysis.run()
+            for manifest in indexed:
+                manifest.save(force=True)
+    finally:
+        sink.close()
+
+    vector_index_updated = _try_update_vector_index(indexed)
+
+    pending = [(manifest, *manifest.pending_imports()) for manifest in indexed]
+    jsonl_gcs_uris = sorted({uri for _, _, uris in pending for uri in uris})
+    document_count = sum(len(indexes) for _, indexes, _ in pending)
+    print(f"[Batch] Importing {document_count} documents from {len(indexed)} videos in {len(jsonl_gcs_uris)} JSONL files...")
+    not_imported = 0
+    if document_count:
+        result = wait_for_import(jsonl_gcs_uris)
+        for manifest, indexes, _ in pending:
+            not_imported += mark_imported(manifest, indexes, result)
+
+    print(f"\n--- Batch complete: {len(indexed)} videos indexed, {len(failed)} failed ---")
+    for video_uri in failed:
+        print(f"Failed: {video_uri}")
+    if not_analyzed:
+        print(f"{not_analyzed} segments were not analyzed; rerun with --resume to retry them.")
+    if not_imported:
+        print(f"{not_imported} documents were not imported; rerun with --resume to retry them.")
+    if not vector_index_updated:
+        print("The vector index update failed; see the error above.")
+    return not not_analyzed and not not_imported and vector_index_updated
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Run the video indexing pipeline for a single video.")
-    parser.add_argument(
+    parser = argparse.ArgumentParser(description="Run the video indexing pipeline for a single video or every video under a GCS prefix.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--video_uri",
-        required=True,
         help="The GCS URI of the single video to process (e.g., gs://my-bucket/videos/match.mp4)",
     )
+    source.add_argument(
+        "--video_prefix",
+        nargs="?",
+        const=f"gs://{config.GCS_BUCKET}/{config.VIDEO_INPUT_FOLDER}/",
+        help="Index every video under this GCS prefix in one batch (defaults to the VIDEO_INPUT_FOLDER of GCS_BUCKET).",
+    )
+    source.add_argument(
+        "--reembed_vector_index",
+        action="store_true",
+        help="Re-embed every document in the vector index with the current embedding model and rebuild it.",
+    )
+    parser.add_argument(
+        "--video_workers",
+        type=int,
+        default=config.BATCH_VIDEO_WORKERS,
+        help="Number of videos to index at once in batch mode.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.ANALYSIS_CONCURRENCY,
+        help="Number of segment analysis requests to keep in flight per video (1 analyzes sequentially). "
+             "Also seeds and caps the adaptive Gemini concurrency window, overriding GEMINI_MAX_CONCURRENCY.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume from the run manifest of a previous run of the same video, skipping finished work.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Upload and analyze each segment as soon as ffmpeg produces it instead of after the full split.",
+    )
+    parser.add_argument(
+        "--source_read_mode",
+        choices=["download", "url"],
+        default=config.SOURCE_READ_MODE,
+        help="Download the source video before splitting, or let ffmpeg range-read it from a signed URL.",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="In batch mode, analyze all segments with one Vertex AI batch prediction job instead of interactive requests.",
+    )
     args = parser.parse_args()
-    run_pipeline(args.video_uri)
+    if args.bulk and args.video_prefix is None:
+        parser.error("--bulk can only be used with --video_prefix")
+    options = dict(
+        concurrency=args.concurrency,
+        resume=args.resume,
+        stream=args.stream,
+        source_read_mode=args.source_read_mode,
+    )
+    succeeded = True
+    if args.reembed_vector_index:
+        reembed_vector_index()
+    elif args.video_uri:
+        succeeded = run_pipeline(args.video_uri, **options)
+    else:
+        succeeded = run_batch(args.video_prefix, video_workers=args.video_workers, bulk=args.bulk, **options)
+    sys.exit(0 if succeeded else 1)
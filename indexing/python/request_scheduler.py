@@ -0,0 +1,215 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from google.genai import errors
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying. 429 and 503 also mean we are over quota or the
+# model is overloaded, so they shrink the concurrency window as well.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at a fixed rate.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and consumes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._last_refill) * self.rate_per_second,
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+
+class ConcurrencyWindow:
+    """
+    An AIMD concurrency limit: grows by one after a full window of successful
+    requests and halves when the service throttles us.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.decrease_cooldown = decrease_cooldown
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def reset(self, initial: int, maximum: int):
+        """
+        Restarts the window at `initial` with a new upper bound.
+        """
+        with self._condition:
+            self.maximum = max(self.minimum, maximum)
+            self.limit = min(max(initial, self.minimum), self.maximum)
+            self._successes = 0
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds one concurrency slot for the duration of the block.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            # Requests that were already in flight when the first throttle
+            # arrived should not keep halving the window.
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            self._successes = 0
+            new_limit = max(self.minimum, self.limit // 2)
+            if new_limit != self.limit:
+                logger.info(f"Throttled: reducing concurrency window from {self.limit} to {new_limit}.")
+            self.limit = new_limit
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+def is_throttle(error: Exception) -> bool:
+    return isinstance(error, errors.APIError) and error.code in THROTTLE_STATUS_CODES
+
+class RequestScheduler:
+    """
+    Schedules calls on a genai client with per-model rate limiting, retries
+    with exponential backoff and jitter, and an adaptive concurrency window.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        initial_concurrency: int,
+        max_concurrency: int,
+    ):
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.window = ConcurrencyWindow(initial_concurrency, 1, max_concurrency)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "successes": 0,
+            "retries": 0,
+            "throttles": 0,
+            "give_ups": 0,
+        }
+
+    def _bucket(self, model: str) -> TokenBucket:
+        with self._lock:
+            if model not in self._buckets:
+                rate = self.requests_per_minute / 60
+                self._buckets[model] = TokenBucket(rate, capacity=max(1.0, rate))
+            return self._buckets[model]
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, model: str, fn, *args, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` under the rate limit and concurrency window
+        for `model`, retrying retryable errors until `max_retries` is exhausted.
+        """
+        bucket = self._bucket(model)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            self._count("requests")
+            try:
+                with self.window.slot():
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if is_throttle(e):
+                    self._count("throttles")
+                    self.window.on_throttle()
+                if attempt == self.max_retries:
+                    self._count("give_ups")
+                    logger.error(f"Giving up on {model} after {attempt + 1} attempts. Error: {e}")
+                    raise
+                delay = self._backoff(attempt)
+                self._count("retries")
+                logger.warning(f"Retryable error from {model} (attempt {attempt + 1}), retrying in {delay:.1f}s. Error: {e}")
+                time.sleep(delay)
+            else:
+                self._count("successes")
+                self.window.on_success()
+                return result
+
+    def set_concurrency(self, initial: int, maximum: int):
+        """
+        Seeds the concurrency window with `initial` requests in flight and
+        caps it at `maximum`, e.g. from a command-line concurrency setting.
+        """
+        self.window.reset(initial, maximum)
+        logger.info(f"Concurrency window set to {self.window.limit} (max {self.window.maximum}).")
+
+    def generate_content(self, **kwargs):
+        """
+        Scheduled equivalent of `client.models.generate_content(**kwargs)`.
+        """
+        return self.call(kwargs["model"], self.client.models.generate_content, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters["concurrency_limit"] = self.window.limit
+        return counters
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+# Internal modules
+import storage_io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _split_gcs_uri(gcs_uri: str) -> tuple[str, str]:
+    if not gcs_uri.startswith("gs://"):
+        raise ValueError("Invalid GCS URI. Must start with 'gs://'")
+    bucket_name, _, blob_name = gcs_uri[5:].partition('/')
+    return bucket_name, blob_name
+
+class ResultCache:
+    """
+    A persistent, size-bounded LRU cache for model responses, stored in SQLite
+    and optionally mirrored to a GCS object between runs.
+    """
+
+    def __init__(self, path: str, max_bytes: int, gcs_uri: Optional[str] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.gcs_uri = gcs_uri
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._storage_client = storage_io.get_client()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if gcs_uri:
+            self._download()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.commit()
+
+    def _download(self):
+        bucket_name, blob_name = _split_gcs_uri(self.gcs_uri)
+        blob = self._storage_client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            logger.info(f"No cache found at {self.gcs_uri}, starting empty.")
+            return
+        blob.download_to_filename(self.path)
+        logger.info(f"Restored result cache from {self.gcs_uri} ({blob.size} bytes).")
+
+    def content_identity(self, gcs_uri: str) -> str:
+        """
+        Identifies the content of a GCS object by its hash, so re-uploading
+        identical bytes keeps hitting the same cache entries.
+        """
+        bucket_name, blob_name = _split_gcs_uri(gcs_uri)
+        blob = self._storage_client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            return gcs_uri
+        if blob.md5_hash:
+            return f"md5:{blob.md5_hash}"
+        if blob.crc32c:
+            return f"crc32c:{blob.crc32c}:{blob.size}"
+        return f"{gcs_uri}#{blob.generation}"
+
+    @staticmethod
+    def make_key(model: str, prompt: str, content_identity: str, response_mime_type: Optional[str]) -> str:
+        payload = json.dumps([model, prompt, content_identity, response_mime_type])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total,
+            }
+
+    def sync(self):
+        """
+        Uploads the cache database to GCS, if a GCS location is configured.
+        """
+        if not self.gcs_uri:
+            return
+        bucket_name, blob_name = _split_gcs_uri(self.gcs_uri)
+        with self._lock:
+            self._db.commit()
+            self._storage_client.bucket(bucket_name).blob(blob_name).upload_from_filename(self.path)
+        logger.info(f"Saved result cache to {self.gcs_uri}.")
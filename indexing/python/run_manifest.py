@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+# Internal modules
+import storage_io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-segment states, in the order a segment moves through the pipeline.
+SEGMENT_STATES = ("split", "uploaded", "analyzed", "written", "imported")
+
+class RunManifest:
+    """
+    Records the progress of an indexing run for a single video so that an
+    interrupted run can be resumed without repeating finished work.
+
+    The manifest is written to a local JSON file and mirrored to GCS at most
+    every `sync_interval` seconds, and on every forced save; changes in
+    between are picked up by the next write, so a crash loses at most
+    `sync_interval` seconds of progress.
+    """
+
+    def __init__(
+        self,
+        video_uri: str,
+        local_dir: str,
+        gcs_bucket_name: Optional[str] = None,
+        gcs_path: Optional[str] = None,
+        sync_interval: float = 30,
+    ):
+        manifest_name = f"{hashlib.sha256(video_uri.encode('utf-8')).hexdigest()[:16]}.json"
+        self.local_path = os.path.join(local_dir, manifest_name)
+        self.gcs_bucket_name = gcs_bucket_name
+        self.gcs_blob_name = f"{gcs_path}/{manifest_name}" if gcs_bucket_name and gcs_path else None
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        # Serializes writes, which happen outside `_lock`, so a slow upload
+        # does not hold up the workers updating segments.
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._written_version = 0
+        self.data = {
+            "video_uri": video_uri,
+            "video_type": None,
+            "global_context": None,
+            "segments": [],
+            "segmentation_complete": False,
+        }
+        os.makedirs(local_dir, exist_ok=True)
+
+    def _gcs_blob(self):
+        if not self.gcs_blob_name:
+            return None
+        return storage_io.get_client().bucket(self.gcs_bucket_name).blob(self.gcs_blob_name)
+
+    def _read_gcs(self) -> Optional[dict]:
+        blob = self._gcs_blob()
+        if blob is None or not blob.exists():
+            return None
+        return json.loads(blob.download_as_text())
+
+    def _read_local(self) -> Optional[dict]:
+        if not os.path.exists(self.local_path):
+            return None
+        with open(self.local_path) as f:
+            return json.load(f)
+
+    def load(self) -> bool:
+        """
+        Loads a previously saved manifest, preferring the GCS copy and falling
+        back to the other copy if one is missing or unreadable.
+
+        Returns:
+            True if a manifest for this video was found.
+        """
+        sources = (
+            (f"gs://{self.gcs_bucket_name}/{self.gcs_blob_name}", self._read_gcs),
+            (self.local_path, self._read_local),
+        )
+        for location, read in sources:
+            try:
+                data = read()
+            except Exception as e:
+                logger.warning(f"Could not read run manifest from {location}: {e}")
+                continue
+            if data is not None:
+                self.data = data
+                logger.info(f"Loaded run manifest from {location}")
+                return True
+        return False
+
+    def save(self, force: bool = False):
+        """
+        Writes the manifest locally and to GCS, unless `force` is false and
+        it was written less than `sync_interval` seconds ago.
+        """
+        with self._lock:
+            now = time.time()
+            if not force and now - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = now
+            self._version += 1
+            version = self._version
+            payload = json.dumps(self.data)
+
+        with self._write_lock:
+            # A newer snapshot was written while this one waited.
+            if version <= self._written_version:
+                return
+            # Write-then-rename, so a crash mid-write never leaves a truncated manifest.
+            temp_path = f"{self.local_path}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(payload)
+            os.replace(temp_path, self.local_path)
+            blob = self._gcs_blob()
+            if blob is not None:
+                blob.upload_from_string(payload, content_type="application/json")
+            self._written_version = version
+
+    @property
+    def segments(self) -> list[dict]:
+        return self.data["segments"]
+
+    @property
+    def segmentation_complete(self) -> bool:
+        return self.data.get("segmentation_complete", bool(self.segments))
+
+    @staticmethod
+    def _new_segment(index: int, segment, state: str) -> dict:
+        signature = getattr(segment, "signature", None)
+        return {
+            "index": index,
+            "uri": segment.uri,
+            # Low-resolution proxy analyzed instead of `uri`, if any.
+            "analysis_uri": getattr(segment, "analysis_uri", None),
+            "start_time": segment.start_time,
+            "duration": segment.duration,
+            "signature": {
+                "frame_hashes": list(signature.frame_hashes),
+                "motion": signature.motion,
+            } if signature is not None else None,
+            "state": state,
+            "analysis": None,
+            "document_id": None,
+            "jsonl_uri": None,
+            # Set when the segment reused the analysis of an earlier one
+            # because it was static ("static") or a duplicate ("duplicate").
+            "prefilter": None,
+            "reused_from": None,
+        }
+
+    def set_segments(self, segments: list, state: str = "uploaded"):
+        """
+        Records the segments of a completed split (`video_processor.Segment`s).
+        """
+        self.data["segments"] = [
+            self._new_segment(i, segment, state)
+            for i, segment in enumerate(segments)
+        ]
+        self.data["segmentation_complete"] = True
+        self.save(force=True)
+
+    def reset_segments(self):
+        """
+        Discards segments from an interrupted streaming split, which has to
+        start over from the beginning of the video.
+        """
+        self.data["segments"] = []
+        self.data["segmentation_complete"] = False
+        self.save(force=True)
+
+    def add_segment(self, segment, state: str = "uploaded") -> int:
+        """
+        Appends a segment produced by a streaming split.
+
+        Returns:
+            The index of the new segment.
+        """
+        with self._lock:
+            index = len(self.segments)
+            self.segments.append(self._new_segment(index, segment, state))
+        self.save()
+        return index
+
+    def complete_segmentation(self):
+        self.data["segmentation_complete"] = True
+        self.save(force=True)
+
+    def has_reached(self, index: int, state: str) -> bool:
+        return SEGMENT_STATES.index(self.segments[index]["state"]) >= SEGMENT_STATES.index(state)
+
+    def set_state(self, indexes, state: str):
+        with self._lock:
+            for index in indexes:
+                self.segments[index]["state"] = state
+        self.save(force=True)
+
+    def mark_analyzed(self, index: int, analysis_data: dict):
+        with self._lock:
+            segment = self.segments[index]
+            segment["analysis"] = analysis_data
+            segment["state"] = "analyzed"
+            # Document IDs stay stable across resumed runs so that re-imports
+            # update documents instead of duplicating them.
+            if not segment["document_id"]:
+                segment["document_id"] = str(uuid.uuid4())
+        self.save()
+
+    def mark_reused(self, index: int, source_index: int, reason: str):
+        """
+        Gives a segment that the pre-filter did not send for analysis the
+        analysis of an earlier segment.
+        """
+        with self._lock:
+            segment = self.segments[index]
+            segment["analysis"] = self.segments[source_index]["analysis"]
+            segment["state"] = "analyzed"
+            segment["prefilter"] = reason
+            segment["reused_from"] = source_index
+            if not segment["document_id"]:
+                segment["document_id"] = str(uuid.uuid4())
+        self.save()
+
+    def mark_written(self, indexes, jsonl_uri: str):
+        with self._lock:
+            for index in indexes:
+                self.segments[index]["state"] = "written"
+                self.segments[index]["jsonl_uri"] = jsonl_uri
+        self.save(force=True)
+
+    def pending_imports(self) -> tuple[list[int], list[str]]:
+        """
+        Returns:
+            The indexes of segments written but not yet imported, and the
+            JSONL files that hold their documents.
+        """
+        with self._lock:
+            indexes = [i for i, segment in enumerate(self.segments) if segment["state"] == "written"]
+            jsonl_uris = sorted({self.segments[i]["jsonl_uri"] for i in indexes})
+        return indexes, jsonl_uris
+
+    def get(self, key: str):
+        return self.data.get(key)
+
+    def set(self, key: str, value):
+        self.data[key] = value
+        self.save(force=True)
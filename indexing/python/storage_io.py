@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor
+import google.auth
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+from google.cloud import storage
+from requests.adapters import HTTPAdapter
+
+# Internal modules
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_client = None
+_upload_executor = None
+_lock = threading.Lock()
+
+def get_client() -> storage.Client:
+    """
+    Returns the process-wide storage client, created on first use with an HTTP
+    connection pool large enough for all upload workers.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(
+                pool_connections=config.STORAGE_POOL_SIZE,
+                pool_maxsize=config.STORAGE_POOL_SIZE,
+            )
+            session.mount("https://", adapter)
+            _client = storage.Client(project=project, credentials=credentials, _http=session)
+        return _client
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    with _lock:
+        if _upload_executor is None:
+            _upload_executor = ThreadPoolExecutor(
+                max_workers=config.STORAGE_UPLOAD_WORKERS,
+                thread_name_prefix="gcs-upload",
+            )
+        return _upload_executor
+
+def upload_file(bucket_name: str, local_path: str, blob_name: str) -> str:
+    """
+    Uploads a local file to GCS. Files above STORAGE_RESUMABLE_THRESHOLD are
+    sent as a chunked resumable upload so a dropped connection only retries
+    the current chunk.
+
+    Returns:
+        The GCS URI of the uploaded object.
+    """
+    blob = get_client().bucket(bucket_name).blob(blob_name)
+    if os.path.getsize(local_path) > config.STORAGE_RESUMABLE_THRESHOLD:
+        blob.chunk_size = config.STORAGE_CHUNK_SIZE
+    blob.upload_from_filename(local_path)
+    return f"gs://{bucket_name}/{blob_name}"
+
+def submit_upload(bucket_name: str, local_path: str, blob_name: str) -> Future:
+    """
+    Schedules `upload_file` on the shared upload pool.
+
+    Returns:
+        A future resolving to the GCS URI of the uploaded object.
+    """
+    return _get_upload_executor().submit(upload_file, bucket_name, local_path, blob_name)
+
+def upload_files(bucket_name: str, files: list[tuple[str, str]]) -> list[str]:
+    """
+    Uploads `(local_path, blob_name)` pairs in parallel on the shared pool.
+
+    Returns:
+        The GCS URIs of the uploaded objects, in the order of `files`.
+    """
+    futures = [submit_upload(bucket_name, local_path, blob_name) for local_path, blob_name in files]
+    return [future.result() for future in futures]
+
+def generate_read_url(bucket_name: str, blob_name: str) -> Optional[str]:
+    """
+    Returns an HTTP URL for reading an object with range requests, so tools
+    like ffmpeg can stream it instead of downloading it first.
+
+    If GCS_READ_ENDPOINT is set, a plain URL on that endpoint is returned so
+    a local HTTP server can stand in for GCS. Otherwise a V4 signed URL is
+    generated, signing through the IAM API when the credentials have no
+    private key (e.g. on Cloud Run).
+
+    Returns:
+        The URL, or None if the credentials cannot sign URLs (e.g. user
+        credentials from `gcloud auth application-default login`, which
+        belong to no service account).
+    """
+    if config.GCS_READ_ENDPOINT:
+        return f"{config.GCS_READ_ENDPOINT.rstrip('/')}/{bucket_name}/{quote(blob_name)}"
+
+    client = get_client()
+    credentials = client._credentials
+    signing_kwargs = {}
+    if not isinstance(credentials, service_account.Credentials):
+        credentials.refresh(Request())
+        service_account_email = getattr(credentials, "service_account_email", None)
+        if not service_account_email:
+            return None
+        signing_kwargs = {
+            "service_account_email": service_account_email,
+            "access_token": credentials.token,
+        }
+    blob = client.bucket(bucket_name).blob(blob_name)
+    return blob.generate_signed_url(
+        version="v4",
+        expiration=timedelta(minutes=config.SIGNED_URL_EXPIRATION_MINUTES),
+        method="GET",
+        **signing_kwargs,
+    )
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import batch_prediction
+import gemini_analyzer
+import main_pipeline
+
+@pytest.fixture(autouse=True)
+def no_result_cache(monkeypatch):
+    monkeypatch.setattr(gemini_analyzer, "cache", None)
+
+def _request(gcs_uri: str) -> batch_prediction.BatchRequest:
+    return batch_prediction.BatchRequest("Describe this clip.", gcs_uri, "application/json")
+
+def test_run_job_answers_every_request_in_order(tmp_path):
+    runner = batch_prediction.FakeBatchRunner()
+    uris = [f"gs://bucket/segments/segment_{i:03d}.mp4" for i in range(3)]
+
+    responses = batch_prediction.run_job(runner, [_request(uri) for uri in uris], str(tmp_path / "job"), poll_seconds=0)
+
+    assert [response.error for response in responses] == [None, None, None]
+    descriptions = [json.loads(response.text)["description"] for response in responses]
+    assert descriptions == [f"Fake analysis of segment_{i:03d}.mp4" for i in range(3)]
+    assert (tmp_path / "job" / "input.jsonl").is_file()
+    assert (tmp_path / "job" / "output" / "predictions.jsonl").is_file()
+
+def test_run_job_reports_unanswered_requests(tmp_path):
+    class DroppingRunner(batch_prediction.FakeBatchRunner):
+        def submit(self, input_uri, output_uri):
+            job_name = super().submit(input_uri, output_uri)
+            output_path = f"{output_uri}predictions.jsonl"
+            with open(output_path) as f:
+                lines = f.read().splitlines()
+            with open(output_path, "w") as f:
+                f.write(lines[0] + "\n")
+            return job_name
+
+    responses = batch_prediction.run_job(
+        DroppingRunner(), [_request("gs://bucket/a.mp4"), _request("gs://bucket/b.mp4")], str(tmp_path / "job"), poll_seconds=0,
+    )
+
+    assert responses[0].text is not None
+    assert responses[1].text is None and responses[1].error
+
+def test_run_job_raises_when_the_job_fails(tmp_path):
+    class FailingRunner(batch_prediction.FakeBatchRunner):
+        def state(self, job_name):
+            return "JOB_STATE_FAILED"
+
+    with pytest.raises(RuntimeError):
+        batch_prediction.run_job(FailingRunner(), [_request("gs://bucket/a.mp4")], str(tmp_path / "job"), poll_seconds=0)
+
+def _describe_file(request_line: dict) -> str:
+    parts = request_line["request"]["contents"][0]["parts"]
+    file_uri = next(part["fileData"]["fileUri"] for part in parts if "fileData" in part)
+    return json.dumps({"description": f"Analysis of {file_uri}", "hash_tags": []})
+
+def _segments(video: str, count: int = 2):
+    for index in range(count):
+        yield index, f"gs://bucket/{video}/segment_{index:03d}.mp4"
+
+def test_bulk_analysis_reports_results_to_each_video(tmp_path):
+    bulk = main_pipeline.BulkAnalysis(batch_prediction.FakeBatchRunner(_describe_file), str(tmp_path / "job"))
+    results = {"match": {}, "episode": {}}
+
+    bulk.collect(_segments("match"), lambda: ("sports", {}), results["match"].__setitem__)
+    bulk.collect(_segments("episode"), lambda: ("soap_opera", {}), results["episode"].__setitem__)
+
+    assert bulk.run() == 0
+    for video, analyses in results.items():
+        assert {index: analysis["description"] for index, analysis in analyses.items()} == {
+            index: f"Analysis of gs://bucket/{video}/segment_{index:03d}.mp4" for index in range(2)
+        }
+
+def test_bulk_analysis_delivers_cached_results_when_the_job_fails(tmp_path, monkeypatch):
+    class FailingRunner(batch_prediction.FakeBatchRunner):
+        def state(self, job_name):
+            return "JOB_STATE_EXPIRED"
+
+    cached_uri = "gs://bucket/match/segment_000.mp4"
+    monkeypatch.setattr(
+        gemini_analyzer,
+        "cached_response",
+        lambda prompt, gcs_uris, response_mime_type: json.dumps({"description": "Cached"}) if gcs_uris == [cached_uri] else None,
+    )
+    bulk = main_pipeline.BulkAnalysis(FailingRunner(), str(tmp_path / "job"))
+    results = {}
+
+    bulk.collect(_segments("match"), lambda: ("sports", {}), results.__setitem__)
+
+    assert bulk.run() == 1
+    assert results == {0: {"description": "Cached"}}
+
+def test_bulk_analysis_leaves_unsupported_videos_pending(tmp_path):
+    runner = batch_prediction.FakeBatchRunner()
+    bulk = main_pipeline.BulkAnalysis(runner, str(tmp_path / "job"))
+    drained = []
+    results = {}
+
+    def segments():
+        for index in range(2):
+            drained.append(index)
+            yield index, f"gs://bucket/unknown/segment_{index:03d}.mp4"
+
+    bulk.collect(segments(), lambda: ("unknown", {}), results.__setitem__)
+    bulk.run()
+
+    assert drained == [0, 1]
+    assert results == {}
+    assert runner.jobs == 0
@@ -0,0 +1,101 @@
+import os
+import shutil
+import threading
+import subprocess
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import ffmpeg
+import pytest
+
+import config
+import storage_io
+import video_processor
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def gcs_read_endpoint(tmp_path, monkeypatch):
+    """Serves `tmp_path/gcs` over HTTP as GCS_READ_ENDPOINT, laid out as <bucket>/<blob>."""
+    root = tmp_path / "gcs"
+    root.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "GCS_READ_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}")
+    yield root
+    server.shutdown()
+    server.server_close()
+
+def _write_test_video(path: str, seconds: int = 4):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    subprocess.run(
+        [
+            "ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=160x120:rate=10",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-y", path,
+        ],
+        check=True,
+    )
+
+@requires_ffmpeg
+def test_ffmpeg_reads_the_source_over_http(tmp_path, gcs_read_endpoint):
+    _write_test_video(str(gcs_read_endpoint / "bucket" / "videos" / "match 1.mp4"))
+
+    video_input, input_options = video_processor._prepare_source("bucket", "videos/match 1.mp4", str(tmp_path), "url")
+
+    assert video_input == f"{config.GCS_READ_ENDPOINT}/bucket/videos/match%201.mp4"
+    assert input_options == video_processor.HTTP_INPUT_OPTIONS
+    output_path = str(tmp_path / "copy.mp4")
+    ffmpeg.input(video_input, **input_options).output(output_path, c="copy").run(quiet=True)
+    assert float(ffmpeg.probe(output_path)["format"]["duration"]) == pytest.approx(4, abs=0.5)
+
+class _UserCredentials:
+    """Stands in for user credentials from `gcloud auth application-default login`."""
+    token = "user-token"
+
+    def refresh(self, request):
+        pass
+
+class _FakeBlob:
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+
+    def download_to_filename(self, path: str):
+        shutil.copyfile(self.source_path, path)
+
+class _FakeBucket:
+    def __init__(self, root: str, bucket_name: str):
+        self.path = os.path.join(root, bucket_name)
+
+    def blob(self, blob_name: str):
+        return _FakeBlob(os.path.join(self.path, blob_name))
+
+class _FakeClient:
+    """A storage client whose objects are files under `root`, with user credentials."""
+    _credentials = _UserCredentials()
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def bucket(self, bucket_name: str):
+        return _FakeBucket(self.root, bucket_name)
+
+def test_user_credentials_fall_back_to_downloading(tmp_path, monkeypatch):
+    source_path = tmp_path / "gcs" / "bucket" / "videos" / "match.mp4"
+    source_path.parent.mkdir(parents=True)
+    source_path.write_bytes(b"video bytes")
+    monkeypatch.setattr(config, "GCS_READ_ENDPOINT", "")
+    monkeypatch.setattr(storage_io, "get_client", lambda: _FakeClient(str(tmp_path / "gcs")))
+
+    assert storage_io.generate_read_url("bucket", "videos/match.mp4") is None
+    download_dir = tmp_path / "download"
+    download_dir.mkdir()
+    video_input, input_options = video_processor._prepare_source("bucket", "videos/match.mp4", str(download_dir), "url")
+
+    assert video_input == str(download_dir / "match.mp4")
+    assert input_options == {}
+    assert (download_dir / "match.mp4").read_bytes() == b"video bytes"
@@ -0,0 +1,168 @@
+import os
+import json
+import logging
+import tempfile
+import numpy as np
+
+# Internal modules
+import storage_io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Files making up an index directory. Vectors are row-aligned with records;
+# for IVF indexes rows are grouped by list, and list i spans rows
+# list_offsets[i]:list_offsets[i + 1].
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+CENTROIDS_FILE = "centroids.npy"
+LIST_OFFSETS_FILE = "list_offsets.npy"
+INDEX_FILES = (META_FILE, VECTORS_FILE, RECORDS_FILE, CENTROIDS_FILE, LIST_OFFSETS_FILE)
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 100_000
+
+def _kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) vectors."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > KMEANS_SAMPLE_SIZE:
+        sample = vectors[rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = sample[assignments == i]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids.astype(np.float32)
+
+def write_index(directory: str, records: list[dict], vectors: np.ndarray, embedder_name: str, ivf_threshold: int):
+    """
+    Writes a vector index: a flat index for up to `ivf_threshold` vectors,
+    otherwise an IVF index with about sqrt(n) lists. All arrays are .npy
+    files so the search app can memory-map them.
+    """
+    os.makedirs(directory, exist_ok=True)
+    count, dimensions = vectors.shape if len(vectors) else (0, 0)
+    meta = {"kind": "flat", "count": count, "dimensions": dimensions, "embedder": embedder_name}
+
+    for name in (CENTROIDS_FILE, LIST_OFFSETS_FILE):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+
+    if count > ivf_threshold:
+        nlist = int(np.sqrt(count))
+        centroids = _kmeans(vectors, nlist)
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        vectors = vectors[order]
+        records = [records[i] for i in order]
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        np.save(os.path.join(directory, CENTROIDS_FILE), centroids)
+        np.save(os.path.join(directory, LIST_OFFSETS_FILE), list_offsets)
+        meta.update(kind="ivf", nlist=nlist)
+
+    np.save(os.path.join(directory, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+    with open(os.path.join(directory, RECORDS_FILE), "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    # Written last so a reader never sees metadata for a partial index.
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f)
+    logger.info(f"Wrote {meta['kind']} vector index with {count} vectors to {directory}")
+
+def read_index(directory: str) -> tuple[list[dict], np.ndarray, dict]:
+    """
+    Returns:
+        The records, vectors and metadata of an index, or empty ones if the
+        directory holds no index.
+    """
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return [], np.zeros((0, 0), dtype=np.float32), {}
+    with open(meta_path) as f:
+        meta = json.load(f)
+    with open(os.path.join(directory, RECORDS_FILE)) as f:
+        records = [json.loads(line) for line in f]
+    return records, np.load(os.path.join(directory, VECTORS_FILE)), meta
+
+def update_index(directory: str, records: list[dict], vectors: np.ndarray, embedder_name: str, ivf_threshold: int):
+    """
+    Adds records to the index in `directory`, replacing existing records with
+    the same id, and rebuilds it. An index built with a different embedder
+    is discarded, since its vectors are not comparable.
+    """
+    existing_records, existing_vectors, meta = read_index(directory)
+    if meta and meta.get("embedder") != embedder_name:
+        logger.warning(f"Discarding vector index built with {meta.get('embedder')}; now using {embedder_name}.")
+        existing_records, existing_vectors = [], existing_vectors[:0]
+
+    replaced = {record["id"] for record in records}
+    keep = [i for i, record in enumerate(existing_records) if record["id"] not in replaced]
+    merged_records = [existing_records[i] for i in keep] + records
+    if keep:
+        merged_vectors = np.concatenate([existing_vectors[keep], vectors])
+    else:
+        merged_vectors = vectors
+    write_index(directory, merged_records, merged_vectors, embedder_name, ivf_threshold)
+
+def download_index(bucket_name: str, gcs_path: str, directory: str) -> bool:
+    """
+    Replaces the index in `directory` with the one mirrored under
+    `gcs_path`, or removes it if nothing is mirrored there, so a local copy
+    left by an earlier run is never merged into the mirror.
+
+    Returns:
+        True if an index was found.
+    """
+    bucket = storage_io.get_client().bucket(bucket_name)
+    found = bucket.blob(f"{gcs_path}/{META_FILE}").exists()
+    os.makedirs(directory, exist_ok=True)
+    for name in INDEX_FILES:
+        local_path = os.path.join(directory, name)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+        blob = bucket.blob(f"{gcs_path}/{name}")
+        if found and blob.exists():
+            blob.download_to_filename(local_path)
+    return found
+
+def upload_index(directory: str, bucket_name: str, gcs_path: str):
+    """Mirrors the index in `directory` to `gcs_path`, metadata last."""
+    files = [name for name in INDEX_FILES if name != META_FILE and os.path.exists(os.path.join(directory, name))]
+    storage_io.upload_files(bucket_name, [(os.path.join(directory, name), f"{gcs_path}/{name}") for name in files])
+    storage_io.upload_file(bucket_name, os.path.join(directory, META_FILE), f"{gcs_path}/{META_FILE}")
+    stale = {CENTROIDS_FILE, LIST_OFFSETS_FILE} - set(files)
+    bucket = storage_io.get_client().bucket(bucket_name)
+    for name in stale:
+        blob = bucket.blob(f"{gcs_path}/{name}")
+        if blob.exists():
+            blob.delete()
+    logger.info(f"Uploaded vector index to gs://{bucket_name}/{gcs_path}")
+
+def write_shard_embeddings(jsonl_gcs_uri: str, document_ids: list[str], vectors: np.ndarray) -> str:
+    """
+    Stores the vectors of the documents in a JSONL shard next to it, as a
+    contiguous float32 array (`<shard>.embeddings.npy`) and the document ids
+    of its rows (`<shard>.embedding_ids.json`).
+
+    Returns:
+        The GCS URI of the array.
+    """
+    bucket_name, _, blob_name = jsonl_gcs_uri[5:].partition("/")
+    stem = blob_name[:-len(".jsonl")] if blob_name.endswith(".jsonl") else blob_name
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vectors_path = os.path.join(temp_dir, "embeddings.npy")
+        ids_path = os.path.join(temp_dir, "embedding_ids.json")
+        np.save(vectors_path, np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(ids_path, "w") as f:
+            json.dump(document_ids, f)
+        vectors_uri, _ = storage_io.upload_files(bucket_name, [
+            (vectors_path, f"{stem}.embeddings.npy"),
+            (ids_path, f"{stem}.embedding_ids.json"),
+        ])
+    return vectors_uri
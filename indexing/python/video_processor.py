@@ -1,75 +1,430 @@
 import os
+import csv
+import time
 import tempfile
 import logging
-from google.cloud import storage
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, NamedTuple, Optional
 import ffmpeg
+import numpy as np
+
+# Internal modules
+import config
+import storage_io
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class SegmentSignature(NamedTuple):
+    """
+    A cheap visual fingerprint of a segment: a 64-bit difference hash of each
+    sampled keyframe and the mean absolute pixel change between consecutive
+    sampled keyframes (0-255).
+    """
+    frame_hashes: tuple
+    motion: float
+
+class Segment(NamedTuple):
+    """
+    A video segment uploaded to GCS, with its start offset and duration in
+    seconds as reported by the ffmpeg segment muxer, its signature if the
+    pre-filter is enabled, and the URI of its analysis proxy if proxies are
+    enabled and it could be transcoded.
+    """
+    uri: str
+    start_time: float
+    duration: float
+    signature: Optional[SegmentSignature] = None
+    analysis_uri: Optional[str] = None
+
+# Bounds the number of ffmpeg splits running at once when several videos are
+# indexed in parallel.
+_split_slots = threading.BoundedSemaphore(config.SPLIT_CONCURRENCY)
+
+_proxy_executor = None
+_proxy_lock = threading.Lock()
+
+def _get_proxy_executor() -> ThreadPoolExecutor:
+    # Shared by all videos so parallel videos do not oversubscribe the CPU.
+    global _proxy_executor
+    with _proxy_lock:
+        if _proxy_executor is None:
+            _proxy_executor = ThreadPoolExecutor(max_workers=config.PROXY_WORKERS, thread_name_prefix="proxy")
+        return _proxy_executor
+
+# Let ffmpeg ride out dropped connections when reading the source over HTTP.
+HTTP_INPUT_OPTIONS = {"reconnect": 1, "reconnect_streamed": 1, "reconnect_delay_max": 10}
+
+def _prepare_source(
+    gcs_bucket_name: str,
+    gcs_video_path: str,
+    temp_dir: str,
+    source_read_mode: str,
+) -> tuple[str, dict]:
+    """
+    Resolves the ffmpeg input for a source video, either by downloading it
+    into `temp_dir` or by handing ffmpeg an HTTP URL it can range-read.
+
+    Returns:
+        The ffmpeg input path or URL and the input options to use with it.
+    """
+    if source_read_mode not in ("url", "download"):
+        raise ValueError(f"Unknown source read mode: {source_read_mode}")
+    if source_read_mode == "url":
+        read_url = storage_io.generate_read_url(gcs_bucket_name, gcs_video_path)
+        if read_url is not None:
+            logger.info(f"Reading video gs://{gcs_bucket_name}/{gcs_video_path} over HTTP range requests.")
+            return read_url, HTTP_INPUT_OPTIONS
+        logger.warning(
+            "The current credentials cannot sign URLs (they belong to no service account), so the video "
+            "is downloaded instead. Use service account credentials or set GCS_READ_ENDPOINT to read it over HTTP."
+        )
+
+    local_video_path = os.path.join(temp_dir, os.path.basename(gcs_video_path))
+    logger.info(f"Downloading video gs://{gcs_bucket_name}/{gcs_video_path} to {local_video_path}...")
+    storage_io.get_client().bucket(gcs_bucket_name).blob(gcs_video_path).download_to_filename(local_video_path)
+    logger.info("Download complete.")
+    return local_video_path, {}
+
+def _read_new_segment_entries(segment_list_path: str, offset: int) -> tuple[list[tuple[str, float, float]], int]:
+    """
+    Reads complete lines appended to an ffmpeg CSV segment list since `offset`.
+
+    Returns:
+        The new (filename, start, end) entries and the offset to resume from.
+    """
+    if not os.path.exists(segment_list_path):
+        return [], offset
+    with open(segment_list_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # Only consume whole lines; ffmpeg may be midway through writing the last one.
+    complete = data[:data.rfind(b'\n') + 1]
+    entries = [
+        (row[0], float(row[1]), float(row[2]))
+        for row in csv.reader(complete.decode('utf8').splitlines())
+        if row
+    ]
+    return entries, offset + len(complete)
+
+# Keyframes are decoded at this size (9x8 blocks of 4x4 pixels) for hashing.
+SIGNATURE_FRAME_WIDTH = 36
+SIGNATURE_FRAME_HEIGHT = 32
+
+def compute_segment_signature(local_segment_path: str) -> Optional[SegmentSignature]:
+    """
+    Decodes only the keyframes of a local segment at a tiny grayscale size
+    and fingerprints them.
+
+    Returns:
+        The signature, or None if the segment could not be decoded (it is then
+        always analyzed).
+    """
+    try:
+        raw, _ = (
+            ffmpeg
+            .input(local_segment_path, skip_frame='nokey')
+            .output(
+                'pipe:', f='rawvideo', pix_fmt='gray', vsync='vfr',
+                s=f'{SIGNATURE_FRAME_WIDTH}x{SIGNATURE_FRAME_HEIGHT}',
+            )
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+    except ffmpeg.Error as e:
+        logger.warning(f"Could not fingerprint {local_segment_path}: {e.stderr.decode('utf8')[-500:]}")
+        return None
+
+    frames = np.frombuffer(raw, dtype=np.uint8)
+    frame_size = SIGNATURE_FRAME_WIDTH * SIGNATURE_FRAME_HEIGHT
+    if len(frames) < frame_size:
+        return None
+    frames = frames[:len(frames) // frame_size * frame_size].reshape(-1, SIGNATURE_FRAME_HEIGHT, SIGNATURE_FRAME_WIDTH)
+    frames = frames.astype(np.float32)
+
+    # Difference hash: average 4x4 blocks down to 9x8 and compare horizontal neighbours.
+    blocks = frames.reshape(len(frames), 8, 4, 9, 4).mean(axis=(2, 4))
+    bits = (blocks[:, :, 1:] > blocks[:, :, :-1]).reshape(len(frames), 64)
+    frame_hashes = tuple(int.from_bytes(row.tobytes(), 'big') for row in np.packbits(bits, axis=1))
+
+    motion = float(np.abs(np.diff(frames, axis=0)).mean()) if len(frames) > 1 else 0.0
+    return SegmentSignature(frame_hashes, motion)
+
+def signature_distance(a: SegmentSignature, b: SegmentSignature) -> float:
+    """
+    Mean Hamming distance from each keyframe of `a` to its closest keyframe in
+    `b`, so footage that is shifted within the segment still matches.
+    """
+    return sum(
+        min(bin(frame_hash ^ other).count('1') for other in b.frame_hashes)
+        for frame_hash in a.frame_hashes
+    ) / len(a.frame_hashes)
+
+class SegmentPrefilter:
+    """
+    Classifies segments of a video, in order, as:
+    - "static": too little motion to be worth analyzing (scoreboards,
+      static studio shots), so it reuses the analysis of the previous segment;
+    - "duplicate": visually the same as an earlier analyzed segment (replays,
+      repeated ads), whose analysis can be reused;
+    - "analyze": everything else.
+    """
+
+    def __init__(self, max_duplicate_distance: float, max_static_motion: float):
+        self.max_duplicate_distance = max_duplicate_distance
+        self.max_static_motion = max_static_motion
+        self._analyzed = []
+        # The analyzed segment whose analysis the previous segment has.
+        self._previous_source = None
+
+    def classify(self, index: int, signature: Optional[SegmentSignature]) -> tuple[str, Optional[int]]:
+        """
+        Returns:
+            The verdict and, for static segments and duplicates, the index of
+            the analyzed segment whose analysis to reuse.
+        """
+        verdict, source_index = self._classify(index, signature)
+        self._previous_source = index if source_index is None else source_index
+        return verdict, source_index
+
+    def _classify(self, index: int, signature: Optional[SegmentSignature]) -> tuple[str, Optional[int]]:
+        if signature is None:
+            return "analyze", None
+        # A single keyframe says nothing about motion, and a static first
+        # segment has no previous analysis to reuse.
+        if (
+            len(signature.frame_hashes) > 1
+            and signature.motion <= self.max_static_motion
+            and self._previous_source is not None
+        ):
+            return "static", self._previous_source
+        for other_index, other in self._analyzed:
+            if signature_distance(signature, other) <= self.max_duplicate_distance:
+                return "duplicate", other_index
+        self._analyzed.append((index, signature))
+        return "analyze", None
+
+def transcode_proxy(local_segment_path: str, proxy_path: str) -> bool:
+    """
+    Encodes a low-resolution, low-frame-rate copy of a segment for analysis.
+
+    Returns:
+        True on success; on failure the segment is analyzed from its
+        full-quality copy.
+    """
+    try:
+        (
+            ffmpeg
+            .input(local_segment_path)
+            .output(
+                proxy_path,
+                vf=f'fps={config.PROXY_FPS},scale=-2:{config.PROXY_HEIGHT}',
+                vcodec='libx264', preset='veryfast', crf=config.PROXY_CRF, pix_fmt='yuv420p',
+                acodec='aac', ac=1, audio_bitrate=config.PROXY_AUDIO_BITRATE,
+                threads=1, movflags='+faststart',
+            )
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+        return True
+    except ffmpeg.Error as e:
+        logger.warning(f"Could not transcode a proxy of {local_segment_path}: {e.stderr.decode('utf8')[-500:]}")
+        return False
+
+def _upload_proxy(gcs_bucket_name: str, local_segment_path: str, proxy_blob_name: str) -> Optional[str]:
+    proxy_path = f"{os.path.splitext(local_segment_path)[0]}_proxy.mp4"
+    if not transcode_proxy(local_segment_path, proxy_path):
+        return None
+    try:
+        return storage_io.upload_file(gcs_bucket_name, proxy_path, proxy_blob_name)
+    finally:
+        os.remove(proxy_path)
+
+def submit_proxy(gcs_bucket_name: str, local_segment_path: str, proxy_blob_name: str) -> Future:
+    """
+    Schedules transcoding and uploading the analysis proxy of a segment on
+    the shared proxy pool.
+
+    Returns:
+        A future resolving to the GCS URI of the proxy, or None if it could
+        not be transcoded.
+    """
+    return _get_proxy_executor().submit(_upload_proxy, gcs_bucket_name, local_segment_path, proxy_blob_name)
+
 def process_video_from_gcs(
     gcs_bucket_name: str,
     gcs_video_path: str,
     segment_duration: int,
     processed_segments_gcs_path: str,
-) -> list[tuple[str, float]]:
+    source_read_mode: str = config.SOURCE_READ_MODE,
+) -> list[Segment]:
     """
-    Downloads a video from GCS, splits it into segments, and uploads them back.
+    Downloads a video from GCS (or range-reads it, see `_prepare_source`),
+    splits it into segments, and uploads them back.
+
+    Segment boundaries come from the segment list ffmpeg writes while
+    splitting, so no per-segment probe is needed and the start offsets match
+    the keyframe-aligned cuts.
 
     Returns:
-        A list of tuples, where each tuple contains the GCS URI and the
-        duration of the newly created video segments.
+        The newly created segments, in order.
     """
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(gcs_bucket_name)
-    source_blob = bucket.blob(gcs_video_path)
     video_filename = os.path.basename(gcs_video_path)
 
-    processed_segments = []
-
     with tempfile.TemporaryDirectory() as temp_dir:
-        local_video_path = os.path.join(temp_dir, video_filename)
-        logger.info(f"Downloading video gs://{gcs_bucket_name}/{gcs_video_path} to {local_video_path}...")
-        source_blob.download_to_filename(local_video_path)
-        logger.info("Download complete.")
+        video_input, input_options = _prepare_source(gcs_bucket_name, gcs_video_path, temp_dir, source_read_mode)
 
         output_template = os.path.join(temp_dir, f"{os.path.splitext(video_filename)[0]}_%04d.mp4")
+        segment_list_path = os.path.join(temp_dir, "segments.csv")
         logger.info(f"Splitting video into {segment_duration}-second segments...")
         
         try:
-            (
-                ffmpeg
-                .input(local_video_path)
-                .output(output_template, f='segment', segment_time=segment_duration, reset_timestamps=1, c='copy')
-                .run(capture_stdout=True, capture_stderr=True, quiet=True)
-            )
+            with _split_slots:
+                (
+                    ffmpeg
+                    .input(video_input, **input_options)
+                    .output(
+                        output_template, f='segment', segment_time=segment_duration, reset_timestamps=1, c='copy',
+                        segment_list=segment_list_path, segment_list_type='csv',
+                    )
+                    .run(capture_stdout=True, capture_stderr=True, quiet=True)
+                )
             logger.info("Video splitting complete.")
         except ffmpeg.Error as e:
             logger.error("ffmpeg error:")
             logger.error(e.stderr.decode('utf8'))
             raise
 
-        # Upload segments to GCS
-        for filename in sorted(os.listdir(temp_dir)):
-            if filename.endswith(".mp4") and filename != video_filename:
-                local_segment_path = os.path.join(temp_dir, filename)
-                
-                # Get the duration of the segment
-                try:
-                    probe = ffmpeg.probe(local_segment_path)
-                    duration = float(probe['format']['duration'])
-                except ffmpeg.Error as e:
-                    logger.error(f"Failed to get duration for {local_segment_path}: {e.stderr.decode('utf8')}")
-                    duration = segment_duration # Fallback to the default segment duration
-
-                segment_blob_name = f"{processed_segments_gcs_path}/{filename}"
-                
-                logger.info(f"Uploading segment {local_segment_path} to gs://{gcs_bucket_name}/{segment_blob_name}...")
-                blob = bucket.blob(segment_blob_name)
-                blob.upload_from_filename(local_segment_path)
-                
-                gcs_uri = f"gs://{gcs_bucket_name}/{segment_blob_name}"
-                processed_segments.append((gcs_uri, duration))
+        entries, _ = _read_new_segment_entries(segment_list_path, 0)
+        uploads = [
+            (os.path.join(temp_dir, filename), f"{processed_segments_gcs_path}/{filename}")
+            for filename, _, _ in entries
+        ]
+
+        # Upload segments to GCS in parallel, fingerprinting them and
+        # transcoding their proxies meanwhile
+        logger.info(f"Uploading {len(uploads)} segments to gs://{gcs_bucket_name}/{processed_segments_gcs_path}...")
+        upload_futures = [
+            storage_io.submit_upload(gcs_bucket_name, local_path, blob_name)
+            for local_path, blob_name in uploads
+        ]
+        proxy_futures = [None] * len(uploads)
+        if config.PROXY_ENABLED:
+            proxy_futures = [
+                submit_proxy(gcs_bucket_name, local_path, f"{config.PROXY_SEGMENTS_GCS_PATH}/{filename}")
+                for (local_path, _), (filename, _, _) in zip(uploads, entries)
+            ]
+        signatures = [None] * len(uploads)
+        if config.SEGMENT_PREFILTER_ENABLED:
+            with ThreadPoolExecutor(max_workers=config.SPLIT_CONCURRENCY) as executor:
+                signatures = list(executor.map(compute_segment_signature, [local_path for local_path, _ in uploads]))
+        gcs_uris = [future.result() for future in upload_futures]
+        analysis_uris = [future.result() if future is not None else None for future in proxy_futures]
+        processed_segments = [
+            Segment(gcs_uri, start, end - start, signature, analysis_uri)
+            for gcs_uri, (_, start, end), signature, analysis_uri in zip(gcs_uris, entries, signatures, analysis_uris)
+        ]
     
     logger.info(f"Successfully processed video into {len(processed_segments)} segments.")
     return processed_segments
+
+def stream_video_segments_from_gcs(
+    gcs_bucket_name: str,
+    gcs_video_path: str,
+    segment_duration: int,
+    processed_segments_gcs_path: str,
+    source_read_mode: str = config.SOURCE_READ_MODE,
+    poll_interval: float = 0.5,
+) -> Iterator[Segment]:
+    """
+    Downloads (or range-reads) a video from GCS and splits it in the
+    background, uploading and yielding each segment as soon as ffmpeg closes
+    it, so that downstream analysis can start after the first segment
+    instead of the whole video.
+
+    Yields:
+        Each segment, in order.
+    """
+    video_filename = os.path.basename(gcs_video_path)
+    segment_count = 0
+    # Uploads run in parallel but segments are yielded in split order.
+    pending_uploads = deque()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_input, input_options = _prepare_source(gcs_bucket_name, gcs_video_path, temp_dir, source_read_mode)
+
+        segments_dir = os.path.join(temp_dir, "segments")
+        os.makedirs(segments_dir)
+        output_template = os.path.join(segments_dir, f"{os.path.splitext(video_filename)[0]}_%04d.mp4")
+        segment_list_path = os.path.join(temp_dir, "segments.csv")
+        ffmpeg_log_path = os.path.join(temp_dir, "ffmpeg.log")
+        logger.info(f"Splitting video into {segment_duration}-second segments (streaming)...")
+
+        args = (
+            ffmpeg
+            .input(video_input, **input_options)
+            .output(
+                output_template, f='segment', segment_time=segment_duration, reset_timestamps=1, c='copy',
+                segment_list=segment_list_path, segment_list_type='csv',
+            )
+            .compile()
+        )
+        _split_slots.acquire()
+        process = None
+        try:
+            with open(ffmpeg_log_path, 'wb') as ffmpeg_log:
+                process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=ffmpeg_log)
+            offset = 0
+            while True:
+                finished = process.poll() is not None
+                entries, offset = _read_new_segment_entries(segment_list_path, offset)
+                for filename, start, end in entries:
+                    local_segment_path = os.path.join(segments_dir, filename)
+                    segment_blob_name = f"{processed_segments_gcs_path}/{filename}"
+                    logger.info(f"Uploading segment {local_segment_path} to gs://{gcs_bucket_name}/{segment_blob_name}...")
+                    future = storage_io.submit_upload(gcs_bucket_name, local_segment_path, segment_blob_name)
+                    proxy_future = None
+                    if config.PROXY_ENABLED:
+                        proxy_future = submit_proxy(
+                            gcs_bucket_name, local_segment_path, f"{config.PROXY_SEGMENTS_GCS_PATH}/{filename}"
+                        )
+                    signature = None
+                    if config.SEGMENT_PREFILTER_ENABLED:
+                        signature = compute_segment_signature(local_segment_path)
+                    pending_uploads.append((future, proxy_future, local_segment_path, start, end, signature))
+
+                # Once ffmpeg has exited, wait for the remaining uploads.
+                while pending_uploads and (finished or all(
+                    future is None or future.done() for future in pending_uploads[0][:2]
+                )):
+                    future, proxy_future, local_segment_path, start, end, signature = pending_uploads.popleft()
+                    gcs_uri = future.result()
+                    analysis_uri = proxy_future.result() if proxy_future is not None else None
+                    # Segments are no longer needed locally once uploaded.
+                    os.remove(local_segment_path)
+                    segment_count += 1
+                    yield Segment(gcs_uri, start, end - start, signature, analysis_uri)
+                if finished:
+                    break
+                time.sleep(poll_interval)
+        finally:
+            for future, proxy_future, *_ in pending_uploads:
+                future.cancel()
+                if proxy_future is not None:
+                    proxy_future.cancel()
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            _split_slots.release()
+
+        if process.returncode != 0:
+            with open(ffmpeg_log_path, 'rb') as ffmpeg_log:
+                stderr = ffmpeg_log.read()
+            logger.error("ffmpeg error:")
+            logger.error(stderr.decode('utf8'))
+            raise ffmpeg.Error('ffmpeg', None, stderr)
+        logger.info("Video splitting complete.")
+
+    logger.info(f"Successfully processed video into {segment_count} segments.")
@@ -13,6 +13,19 @@ DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "downloads")
 YOUTUBE_PLAYLIST_ID = os.getenv("YOUTUBE_PLAYLIST_ID")
 NUM_VIDEOS = int(os.getenv("NUM_VIDEOS", 5))
 GCS_FILENAME_PREFIX = os.getenv("GCS_FILENAME_PREFIX", "")
+# Source videos are uploaded as chunked resumable uploads of this size (a multiple of 256 KiB).
+GCS_UPLOAD_CHUNK_SIZE = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", 16 * 1024 * 1024))
+
+_storage_client = None
+
+def get_storage_client():
+    """
+    Returns a storage client shared by all uploads in this process.
+    """
+    global _storage_client
+    if _storage_client is None:
+        _storage_client = storage.Client()
+    return _storage_client
 
 
 def upload_and_cleanup(filepath, bucket_name):
@@ -25,9 +38,8 @@ def upload_and_cleanup(filepath, bucket_name):
 
     new_filename = f"{GCS_FILENAME_PREFIX}{os.path.basename(filepath)}"
     print(f"\nUploading {os.path.basename(filepath)} as {new_filename} to GCS bucket {bucket_name}...")
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(new_filename)
+    bucket = get_storage_client().bucket(bucket_name)
+    blob = bucket.blob(new_filename, chunk_size=GCS_UPLOAD_CHUNK_SIZE)
     
     try:
         blob.upload_from_filename(filepath)